@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import logging
+import argparse
+import tempfile
+
+from lib.benchmark import run_suite, compare
+
+
+def benchmark(args):
+    try:
+        sys.dont_write_bytecode = True
+        import config
+        sys.dont_write_bytecode = False
+
+    except ImportError:
+        print("Could not import config file.")
+        print("Copy config.py.EXAMPLE to config.py and adapt it for your setup.")
+        exit(1)
+
+    level = config.log_level if args.verbose else logging.WARNING
+    logging.basicConfig(level=level, format=config.log_format)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_suite(config, workdir, rounds=args.rounds, only=args.only)
+    with open(args.jsonfile, 'w') as f:
+        json.dump(results, f, indent=1)
+
+    for name, result in results['benchmarks'].items():
+        print("%-28s %12.3f us" % (name, result['min_us']))
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            old = json.load(f)
+        print("\ncompared to %s (%s)" % (args.compare, old.get('commit')))
+        regressed = False
+        for name, before, after, ratio, worse in compare(old, results, args.threshold):
+            print("%-28s %12.3f -> %12.3f us %6.2fx%s" % (
+                name, before, after, ratio, "  REGRESSION" if worse else ""))
+            regressed = regressed or worse
+        if regressed:
+            exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Time the hot paths of the controller against simulated hardware '
+                    'and write the results to a JSON file.')
+    parser.add_argument('jsonfile', type=str,
+                        help="Write the results here")
+    parser.add_argument('--compare', type=str, default=None,
+                        help="Results of an earlier run, exit 1 if anything got slower")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Slowdown that counts as a regression (default: 0.2, 20%%)")
+    parser.add_argument('--rounds', type=int, default=5,
+                        help="Time every benchmark this many times, the fastest counts")
+    parser.add_argument('--only', type=str, default=None,
+                        help="Only run benchmarks whose name contains this")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Log at config.log_level instead of warnings only")
+    args = parser.parse_args()
+
+    benchmark(args)
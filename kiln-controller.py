@@ -1,11 +1,18 @@
 #!/usr/bin/env python
 
 from lib.ovenWatcher import OvenWatcher
-from lib.oven import SimulatedOven, RealOven, Profile
+from lib.oven import SimulatedOven, RealOven, Profile, runlog_path
+from lib import history
+from lib.profileCatalog import ProfileCatalog
+from lib.broadcast import BroadcastHub
+from lib import metrics
+from lib.threadStats import ThreadMonitor
+from lib.profiler import SamplingProfiler
 import os
 import sys
 import logging
 import json
+import threading
 
 import bottle
 import gevent
@@ -35,6 +42,7 @@ log.info("Starting kiln controller")
 script_dir = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, script_dir + '/lib/')
 profile_path = os.path.join(script_dir, "storage", "profiles")
+profiles = ProfileCatalog(profile_path)
 
 
 app = bottle.Bottle()
@@ -45,7 +53,35 @@ if config.simulate == True:
 else:
     log.info("this is a real kiln")
     oven = RealOven(config)
-ovenWatcher = OvenWatcher(oven)
+broadcast = BroadcastHub(config.status_queue_size, config.status_slow_client)
+ovenWatcher = OvenWatcher(oven, broadcast)
+
+# cpu and wakeups of every long lived thread, reported by /stats
+threadMonitor = ThreadMonitor(config.thread_stats_interval)
+threadMonitor.register(threading.main_thread(), "web")
+threadMonitor.register(oven, "oven")
+threadMonitor.register(ovenWatcher, "watcher")
+for name in ("sensor_scheduler", "heater_scheduler"):
+    thread = getattr(oven, name, None)
+    if thread is not None:
+        threadMonitor.register(thread, thread.name)
+for zone in oven.zones:
+    # sensors only run their own thread without a scheduler
+    if zone.temp_sensor.is_alive():
+        threadMonitor.register(zone.temp_sensor, "sensor " + zone.zone_name)
+threadMonitor.start()
+
+metrics.REGISTRY.register(metrics.Counter(
+    'kiln_rejected_samples_total', 'Thermocouple samples rejected as outliers',
+    labelnames=('zone',),
+    fn=lambda: {z.name: z.rejected for z in Zone.snapshot().zones}))
+metrics.REGISTRY.register(metrics.Counter(
+    'kiln_websocket_dropped_frames_total', 'Status frames dropped for slow clients',
+    fn=lambda: broadcast.dropped))
+metrics.REGISTRY.register(metrics.Counter(
+    'kiln_runlog_bytes_total', 'Bytes written to runlogs',
+    fn=lambda: oven.runlog.bytes_written + (
+        oven.binary_runlog.bytes_written if oven.binary_runlog else 0)))
 
 
 @app.route('/')
@@ -74,9 +110,6 @@ def handle_api():
         if profile is None:
             return {"success": False, "error": "profile %s not found" % wanted}
 
-        # FIXME juggling of json should happen in the Profile class
-        profile_json = json.dumps(profile)
-        profile = Profile(profile_json)
         oven.run_profile(profile, startat=startat)
         ovenWatcher.record(profile)
 
@@ -84,23 +117,112 @@ def handle_api():
         log.info("api stop command received")
         oven.abort_run()
 
+    if bottle.request.json['cmd'] == 'profile':
+        return run_profiler(bottle.request.json)
+
     return {"success": True}
 
 
+profiler = None
+
+
+def run_profiler(request):
+    '''profile the running controller for a while and return the summary.
+       the duration and overhead are capped by config so it is safe during
+       a firing. only one profile runs at a time'''
+    global profiler
+    if profiler is not None and profiler.is_alive():
+        return {"success": False, "error": "a profile is already running"}
+    try:
+        seconds = float(request.get('seconds', 10))
+        top = int(request.get('top', 20))
+    except (TypeError, ValueError):
+        return {"success": False, "error": "bad seconds or top"}
+    if not seconds > 0 or top < 1:
+        return {"success": False, "error": "seconds and top must be positive"}
+    memory = bool(request.get('memory', False))
+    # tracing every allocation slows the whole process down, keep it short
+    seconds = min(seconds, config.profile_memory_max_seconds if memory
+                  else config.profile_max_seconds)
+    profiler = SamplingProfiler(
+        seconds,
+        interval=config.profile_interval,
+        max_overhead=config.profile_max_overhead,
+        cpu=bool(request.get('cpu', True)),
+        memory=memory,
+        top=top)
+    log.info("profiling for %.1fs" % (seconds,))
+    profiler.start()
+    # the web server runs on gevent, yield to it instead of blocking
+    while profiler.is_alive():
+        gevent.sleep(0.2)
+    if profiler.error is not None:
+        return {"success": False, "error": profiler.error}
+    return {"success": True, "profile": profiler.result}
+
+
 def find_profile(wanted):
     '''
-    given a wanted profile name, find it and return the parsed
-    json profile object or None.
+    given a wanted profile name, find it and return the
+    Profile or None.
+    '''
+    return profiles.find(wanted)
+
+
+@app.get('/stats')
+def handle_stats():
+    stats = {"broadcast": broadcast.stats(), "threads": threadMonitor.stats()}
+    sensor_scheduler = getattr(oven, "sensor_scheduler", None)
+    if sensor_scheduler is not None:
+        stats["sensors"] = sensor_scheduler.stats()
+    heater_scheduler = getattr(oven, "heater_scheduler", None)
+    if heater_scheduler is not None:
+        stats["heaters"] = heater_scheduler.stats()
+    return stats
+
+
+@app.get('/metrics')
+def handle_metrics():
+    '''prometheus text format'''
+    bottle.response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    return metrics.REGISTRY.render()
+
+
+@app.get('/history')
+def handle_history_list():
+    return {"current": oven.runID, "runs": history.list_runs(runlog_path)}
+
+
+@app.get('/history/<run_id>')
+def handle_history(run_id):
+    '''
+    a runlog reduced to ?points=N per series, or the rows between
+    ?start= and ?end= (seconds since the start of the run) in full.
+    run_id "current" is the running schedule.
     '''
-    # load all profiles from disk
-    profiles = get_profiles()
-    json_profiles = json.loads(profiles)
+    if run_id == "current":
+        run_id = oven.runID
+        if run_id is None:
+            return {"success": False, "error": "no schedule running"}
+        oven.flush_runlog()
+    if not history.is_run_id(run_id):
+        return {"success": False, "error": "bad run id"}
+
+    data = history.load_run(runlog_path, run_id)
+    if data is None:
+        return {"success": False, "error": "run %s not found" % run_id}
+
+    query = bottle.request.query
+    try:
+        points = int(query.get('points', 500))
+        start = float(query['start']) if 'start' in query else None
+        end = float(query['end']) if 'end' in query else None
+    except ValueError:
+        return {"success": False, "error": "bad points, start or end"}
 
-    # find the wanted profile
-    for profile in json_profiles:
-        if profile['name'] == wanted:
-            return profile
-    return None
+    result = history.history(data, points, start, end)
+    result.update({"success": True, "run": run_id})
+    return result
 
 
 @app.route('/picoreflow/:filename#.*#')
@@ -217,27 +339,26 @@ def handle_config():
 @app.route('/status')
 def handle_status():
     wsock = get_websocket_from_request()
-    ovenWatcher.add_observer(wsock)
+    # /status?v=2 streams keyframes and deltas, &deflate=1 compresses
+    # the backlog. plain /status is the original full frame protocol
+    query = bottle.request.query
+    version = 2 if query.get('v') == '2' else 1
+    deflate = query.get('deflate') == '1'
+    subscriber = ovenWatcher.add_observer(wsock, version, deflate)
     log.info("websocket (status) opened")
-    while True:
+    while not subscriber.closed:
         try:
             message = wsock.receive()
-            wsock.send("Your message was: %r" % message)
+            if message is None:
+                break
         except WebSocketError:
             break
+    ovenWatcher.remove_observer(subscriber)
     log.info("websocket (status) closed")
 
 
 def get_profiles():
-    try:
-        profile_files = os.listdir(profile_path)
-    except:
-        profile_files = []
-    profiles = []
-    for filename in profile_files:
-        with open(os.path.join(profile_path, filename), 'r') as f:
-            profiles.append(json.load(f))
-    return json.dumps(profiles)
+    return profiles.listing()
 
 
 def save_profile(profile, force=False):
@@ -250,6 +371,7 @@ def save_profile(profile, force=False):
     with open(filepath, 'w+') as f:
         f.write(profile_json)
         f.close()
+    profiles.forget(filename)
     log.info("Wrote %s" % filepath)
     return True
 
@@ -259,6 +381,7 @@ def delete_profile(profile):
     filename = profile['name']+".json"
     filepath = os.path.join(profile_path, filename)
     os.remove(filepath)
+    profiles.forget(filename)
     log.info("Deleted %s" % filepath)
     return True
 
@@ -272,7 +395,7 @@ def get_config():
             "kwh_rate": config.kwh_rate,
             "currency_type": config.currency_type,
             "hazard_temp": config.emergency_shutoff_temp,
-            "zones": [{"Name": z['Name'], "Heated": z['Heated']} for z in Zone.stats]
+            "zones": [{"Name": z.name, "Heated": z.heated} for z in Zone.snapshot().zones]
         }
     )
 
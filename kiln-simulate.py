@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+from lib.oven import Profile
+from lib.simulator import run_simulation
+
+
+def simulate(profile_name, speedup, startat, seed, max_hours, verbose):
+    try:
+        sys.dont_write_bytecode = True
+        import config
+        sys.dont_write_bytecode = False
+
+    except ImportError:
+        print("Could not import config file.")
+        print("Copy config.py.EXAMPLE to config.py and adapt it for your setup.")
+        exit(1)
+
+    level = config.log_level if verbose else logging.WARNING
+    logging.basicConfig(level=level, format=config.log_format)
+
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    profile_file = os.path.join(
+        script_dir, "storage", "profiles", profile_name + ".json")
+    with open(profile_file, 'r') as f:
+        profile = Profile(f.read())
+
+    max_runtime = max_hours * 3600 if max_hours else None
+    started = time.time()
+    oven = run_simulation(config, profile, speedup=speedup, startat=startat,
+                          seed=seed, max_runtime=max_runtime)
+    elapsed = time.time() - started
+
+    print("simulated %s: %d s of kiln time in %.1f s (%.0fx)" % (
+        profile.name,
+        oven.clock.monotonic(),
+        elapsed,
+        oven.clock.monotonic() / elapsed if elapsed else 0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Run a kiln schedule against the simulated oven faster than real time. '
+                    'The runlog is written to storage/runlog.')
+    parser.add_argument('profile', type=str,
+                        help="Name of a profile in storage/profiles")
+    parser.add_argument('--speedup', type=float, default=None,
+                        help="Run this many times faster than real time (default: as fast as possible)")
+    parser.add_argument('--startat', type=int, default=0,
+                        help="Start at this minute of the schedule")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed the simulated zone divergence for repeatable runs")
+    parser.add_argument('--max-hours', type=float, default=None,
+                        help="Stop after this many hours of kiln time")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="Log at config.log_level instead of warnings only")
+    args = parser.parse_args()
+
+    simulate(args.profile, args.speedup, args.startat,
+             args.seed, args.max_hours, args.verbose)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import csv
+import time
+import logging
+import argparse
+
+from lib.oven import Profile
+from lib.ensemble import EnsembleSimulator, grid
+
+
+def floats(value):
+    return [float(v) for v in value.split(',')]
+
+
+def sweep(args):
+    try:
+        sys.dont_write_bytecode = True
+        import config
+        sys.dont_write_bytecode = False
+
+    except ImportError:
+        print("Could not import config file.")
+        print("Copy config.py.EXAMPLE to config.py and adapt it for your setup.")
+        exit(1)
+
+    logging.basicConfig(level=logging.WARNING, format=config.log_format)
+
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    profile_path = os.path.join(script_dir, "storage", "profiles")
+    names = args.profiles
+    if not names:
+        names = sorted(f[:-5] for f in os.listdir(profile_path)
+                       if f.endswith('.json'))
+
+    values = {}
+    for name in ('pid_kp', 'pid_ki', 'pid_kd',
+                 'zone_max_lag', 'kiln_must_catch_up_max_error'):
+        values[name] = getattr(args, name) or [getattr(config, name)]
+    params = grid(**values)
+
+    max_runtime = args.max_hours * 3600 if args.max_hours else None
+    with open(args.csvfile, 'w', newline='') as f:
+        out = None
+        for name in names:
+            with open(os.path.join(profile_path, name + ".json"), 'r') as pf:
+                profile = Profile(pf.read())
+            started = time.time()
+            ensemble = EnsembleSimulator(
+                config, profile, params, seed=args.seed)
+            results = ensemble.run(max_runtime=max_runtime)
+            print("%s: %d members in %.1f s" %
+                  (profile.name, ensemble.size, time.time() - started))
+
+            if out is None:
+                out = csv.writer(f)
+                out.writerow(['profile'] + list(results.keys()))
+            for i in range(ensemble.size):
+                out.writerow([profile.name] +
+                             [results[k][i] for k in results])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Sweep pid and zone settings across profiles with the simulated oven '
+                    '(requires numpy to be pip installed). '
+                    'Comma separated values, anything not given comes from config.py.')
+    parser.add_argument('csvfile', type=str,
+                        help="The CSV file to write results to.")
+    parser.add_argument('--profiles', type=str, nargs='*',
+                        help="Profile names to run (default: all in storage/profiles)")
+    parser.add_argument('--kp', dest='pid_kp', type=floats)
+    parser.add_argument('--ki', dest='pid_ki', type=floats)
+    parser.add_argument('--kd', dest='pid_kd', type=floats)
+    parser.add_argument('--zone-max-lag', dest='zone_max_lag', type=floats)
+    parser.add_argument('--max-error', dest='kiln_must_catch_up_max_error', type=floats,
+                        help="kiln_must_catch_up_max_error values")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed the simulated zone divergence for repeatable runs")
+    parser.add_argument('--max-hours', type=float, default=None,
+                        help="Stop members that can not catch up after this many hours of kiln time")
+    sweep(parser.parse_args())
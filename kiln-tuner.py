@@ -40,8 +40,8 @@ def recordprofile(csvfile, targettemp):
     f = open(csvfile, 'w')
     csvout = csv.writer(f)
     header = ['time', 'temperature']
-    for zone in Zone.stats:
-        header.append(zone["Name"])
+    for zone in Zone.snapshot().zones:
+        header.append(zone.name)
     csvout.writerow(header)
 
     # Main loop:
@@ -62,8 +62,8 @@ def recordprofile(csvfile, targettemp):
             oven.update_temperature()
             temp = oven.temperature
             row = [time.time(), temp]
-            for zone in Zone.stats:
-                row.append(zone["Temp"])
+            for zone in Zone.snapshot().zones:
+                row.append(zone.temp)
             csvout.writerow(row)
             f.flush()
 
@@ -1,5 +1,6 @@
 class SensorConfig():
-    def __init__(self, cs_pin, offset, tc_type=None) -> None:
+    def __init__(self, cs_pin, offset, tc_type=None, drdy_pin=None) -> None:
         self.cs_pin = cs_pin
         self.offset = offset
         self.tc_type = tc_type
+        self.drdy_pin = drdy_pin
@@ -0,0 +1,301 @@
+import os
+import gc
+import json
+import time
+import random
+import logging
+import platform
+import datetime
+import itertools
+import subprocess
+
+from lib.clock import VirtualClock
+from lib.oven import SimulatedOven, Profile, PID
+from lib.zone import Zone
+
+log = logging.getLogger(__name__)
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def synthetic_profile(points: int, name: str = "benchmark") -> Profile:
+    '''a ramp and hold profile with points points, 10 minutes apart'''
+    rng = random.Random(points)
+    data = []
+    temp = 20
+    for i in range(points):
+        if i % 2:
+            temp = min(temp + rng.randint(1, 50), 1300)
+        data.append([i * 600, temp])
+    return Profile(json.dumps({'name': name, 'type': 'profile', 'data': data}))
+
+
+def simulated_oven(config, workdir, profile: Profile) -> SimulatedOven:
+    '''a simulated oven in the middle of running profile, writing its
+       runlog to workdir instead of storage'''
+    Zone.table.clear()
+    oven = SimulatedOven(config, clock=VirtualClock(), autostart=False)
+    oven.runlog.path = os.path.join(workdir, "runlog")
+    if oven.binary_runlog is not None:
+        oven.binary_runlog.path = oven.runlog.path
+    oven.update_temperature()
+    oven.run_profile(profile)
+    for i in range(30):
+        oven.loop_timer.wait()
+        oven.update_temperature()
+        oven.tick()
+    return oven
+
+
+class FakeSocket():
+    '''stands in for a websocket, counts what would have been sent'''
+
+    def __init__(self):
+        self.sent = 0
+        self.bytes = 0
+
+    def send(self, frame):
+        self.sent += 1
+        self.bytes += len(frame)
+
+    def close(self):
+        pass
+
+
+def bench_profile_target(points):
+    def setup(config, workdir):
+        if points is None:
+            with open(os.path.join(script_dir, "storage", "profiles",
+                                   "cone-05-fast-bisque.json")) as f:
+                profile = Profile(f.read())
+        else:
+            profile = synthetic_profile(points)
+        rng = random.Random(1)
+        times = itertools.cycle(
+            [rng.uniform(0, profile.get_duration()) for i in range(1000)])
+        return lambda: profile.get_target_temperature(next(times))
+    return setup
+
+
+def bench_pid_compute(config, workdir):
+    clock = VirtualClock()
+    pid = PID(ki=config.pid_ki, kp=config.pid_kp, kd=config.pid_kd,
+              stop_integral_windup=config.stop_integral_windup, clock=clock)
+    rng = random.Random(1)
+    points = itertools.cycle(
+        [(t, t + rng.gauss(0, 5)) for t in range(100, 1100)])
+
+    def step():
+        clock.wait(config.sensor_time_wait)
+        setpoint, ispoint = next(points)
+        pid.compute(setpoint, ispoint)
+    return step
+
+
+def bench_zone_avg_temp(zones, update):
+    def setup(config, workdir):
+        Zone.table.clear()
+        for i in range(zones):
+            Zone.table.add("zone %d" % (i,), True, config.sensor_time_wait)
+        rng = random.Random(1)
+        for i in range(zones):
+            Zone.table.update(i, rng.uniform(20, 1300), 1.0, 0)
+        slots = itertools.cycle(range(zones))
+        if not update:
+            return Zone.getAvgTemp
+
+        def step():
+            # a new reading, so the snapshot has to be rebuilt
+            slot = next(slots)
+            Zone.table.update(slot, 500.0 + slot, 1.0, 0)
+            Zone.getAvgTemp()
+        return step
+    return setup
+
+
+def bench_sensor_frame(chips):
+    def setup(config, workdir):
+        from lib import hardware
+        from lib.max31856 import MAX31856, SampleType
+        from lib.sensorScheduler import SensorScheduler
+        # the real driver against the register level fake chips
+        if hardware.backend.name != 'fake':
+            hardware.use('fake')
+        board = hardware.board
+        board.reset()
+        # on simulated time every frame finds a finished conversion
+        clock = board.clock = VirtualClock()
+        sensors = []
+        for i in range(chips):
+            cs = hardware.digitalio.DigitalInOut(getattr(board, "D%d" % (i,)))
+            cs.switch_to_output(value=True)
+            board.thermocouple(cs.pin, temperature=500.0)
+            sensors.append(MAX31856(board.SPI(), cs, continuous=True,
+                                    samples=SampleType.AVG_SEL_4SAMP))
+        scheduler = SensorScheduler(sensors, config.sensor_time_wait, clock=clock)
+
+        def step():
+            clock.wait(scheduler.period)
+            scheduler.read_frame()
+        return step
+    return setup
+
+
+def bench_write_to_runlog(config, workdir):
+    oven = simulated_oven(config, workdir, synthetic_profile(10))
+
+    def step():
+        oven.clock.wait(oven.time_step)
+        oven.write_to_runlog()
+    return step
+
+
+def watcher(config, workdir):
+    from lib.broadcast import BroadcastHub
+    from lib.ovenWatcher import OvenWatcher
+    profile = synthetic_profile(10)
+    oven = simulated_oven(config, workdir, profile)
+    hub = BroadcastHub(config.status_queue_size, config.status_slow_client)
+    ovenWatcher = OvenWatcher(oven, hub, autostart=False)
+    ovenWatcher.record(profile)
+    return oven, hub, ovenWatcher
+
+
+def bench_notify_all(sockets):
+    def setup(config, workdir):
+        import gevent
+        oven, hub, ovenWatcher = watcher(config, workdir)
+        for i in range(sockets):
+            # half the clients speak the delta protocol
+            hub.subscribe(FakeSocket(), version=1 + i % 2)
+        gevent.sleep(0)
+        state = oven.get_state()
+        runtimes = itertools.count(state['runtime'])
+
+        def step():
+            # a new runtime every frame, so v2 clients get a real delta
+            ovenWatcher.notify_all(dict(state, runtime=next(runtimes)))
+            # deliver to every subscriber like the gevent hub would
+            hub.drain()
+            gevent.sleep(0)
+        return step
+    return setup
+
+
+def bench_lastlog_subset(rows):
+    def setup(config, workdir):
+        oven, hub, ovenWatcher = watcher(config, workdir)
+        rng = random.Random(1)
+        zones = len(ovenWatcher.history_zones)
+        temp = 20.0
+        for i in range(rows):
+            temp += rng.uniform(-0.5, 1.0)
+            ovenWatcher.history.append(
+                [i * 2, temp, temp + 1] + [temp + rng.uniform(-5, 5)
+                                           for z in range(zones)])
+        return ovenWatcher.lastlog_subset
+    return setup
+
+
+def bench_get_profiles(files, cold):
+    def setup(config, workdir):
+        from lib.profileCatalog import ProfileCatalog
+        path = os.path.join(workdir, "profiles")
+        os.makedirs(path, exist_ok=True)
+        rng = random.Random(1)
+        for i in range(files):
+            name = "profile-%05d" % (i,)
+            data = [[t * 600, rng.randint(20, 1300)] for t in range(10)]
+            with open(os.path.join(path, name + ".json"), 'w') as f:
+                json.dump({'name': name, 'type': 'profile', 'data': data}, f)
+        if cold:
+            return lambda: ProfileCatalog(path).listing()
+        return ProfileCatalog(path).listing
+    return setup
+
+
+# name, calls per round, setup(config, workdir) -> function to time
+SUITE = [
+    ('profile_target_small', 10000, bench_profile_target(None)),
+    ('profile_target_huge', 10000, bench_profile_target(20000)),
+    ('pid_compute', 10000, bench_pid_compute),
+    ('zone_avg_temp_256_cached', 10000, bench_zone_avg_temp(256, False)),
+    ('zone_avg_temp_256_updated', 1000, bench_zone_avg_temp(256, True)),
+    ('sensor_frame_4', 2000, bench_sensor_frame(4)),
+    ('write_to_runlog', 2000, bench_write_to_runlog),
+    ('notify_all_1', 1000, bench_notify_all(1)),
+    ('notify_all_50', 200, bench_notify_all(50)),
+    ('notify_all_500', 20, bench_notify_all(500)),
+    ('lastlog_subset_100k', 10, bench_lastlog_subset(100000)),
+    ('get_profiles_10k_cold', 1, bench_get_profiles(10000, True)),
+    ('get_profiles_10k', 10, bench_get_profiles(10000, False)),
+]
+
+
+def measure(step, calls: int, rounds: int) -> dict:
+    '''seconds per call of step, over rounds rounds of calls calls each.
+       garbage collection is held off while timing, like timeit does'''
+    step()
+    times = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for r in range(rounds):
+            start = time.perf_counter()
+            for i in range(calls):
+                step()
+            times.append((time.perf_counter() - start) / calls)
+    finally:
+        if enabled:
+            gc.enable()
+    times.sort()
+    return {
+        'calls': calls,
+        'rounds': rounds,
+        'min_us': round(times[0] * 1e6, 3),
+        'median_us': round(times[len(times) // 2] * 1e6, 3),
+        'max_us': round(times[-1] * 1e6, 3),
+    }
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=script_dir,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(config, workdir, rounds: int = 5, only: str = None) -> dict:
+    '''run every benchmark whose name contains only, returns the results
+       with enough about the machine to tell comparable runs apart'''
+    results = {}
+    for name, calls, setup in SUITE:
+        if only and only not in name:
+            continue
+        step = setup(config, os.path.join(workdir, name))
+        results[name] = measure(step, calls, rounds)
+        log.info("%s: %.3fus" % (name, results[name]['min_us']))
+    Zone.table.clear()
+    return {
+        'commit': commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'benchmarks': results,
+    }
+
+
+def compare(old: dict, new: dict, threshold: float = 0.2) -> list:
+    '''(name, old us, new us, ratio, regressed) for every benchmark in
+       both runs. the fastest round is compared, it is the least noisy'''
+    rows = []
+    for name, result in new['benchmarks'].items():
+        before = old['benchmarks'].get(name)
+        if before is None:
+            continue
+        ratio = result['min_us'] / before['min_us'] if before['min_us'] else 1.0
+        rows.append((name, before['min_us'], result['min_us'], ratio,
+                     ratio > 1 + threshold))
+    return rows
@@ -0,0 +1,150 @@
+import collections
+import logging
+
+import gevent
+import gevent.event
+
+from lib.statusStream import StatusFrame
+
+log = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+
+class Subscriber():
+    '''one websocket with its own bounded queue and sender greenlet.
+
+       version 1 clients get every status frame in full. version 2 clients
+       get deltas, and a keyframe whenever a frame was skipped or the
+       encoder could not build a delta.'''
+
+    def __init__(self, hub, wsock, maxsize, policy, version=1):
+        self.hub = hub
+        self.wsock = wsock
+        self.maxsize = maxsize
+        self.policy = policy
+        self.version = version
+        self.last_seq = None
+        self.queue = collections.deque()
+        self.ready = gevent.event.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.greenlet = gevent.spawn(self.send_loop)
+
+    def offer(self, frame, force=False):
+        '''queue a frame, only ever called in the gevent hub'''
+        if self.closed:
+            return
+        if not force and len(self.queue) >= self.maxsize:
+            if self.policy == DISCONNECT:
+                log.warning("status client %s too slow, disconnecting" %
+                            (self.wsock,))
+                self.hub.disconnected += 1
+                self.close()
+                return
+            self.queue.popleft()
+            self.dropped += 1
+            self.hub.dropped += 1
+        self.queue.append(frame)
+        self.ready.set()
+
+    def send_loop(self):
+        while not self.closed:
+            self.ready.wait()
+            self.ready.clear()
+            while self.queue and not self.closed:
+                frame = self.payload(self.queue.popleft())
+                try:
+                    self.wsock.send(frame)
+                    self.sent += 1
+                    self.hub.bytes_sent += len(frame)
+                except Exception:
+                    log.error("could not write to socket %s" % self.wsock)
+                    self.close()
+        # closing blocks, so it is done here and never in the gevent hub,
+        # where close() may be called from offer()
+        try:
+            self.wsock.close()
+        except Exception as e:
+            log.warning("could not close socket %s: %s" % (self.wsock, e))
+
+    def payload(self, frame):
+        if not isinstance(frame, StatusFrame):
+            return frame
+        if self.version < 2:
+            return frame.full
+        in_sequence = self.last_seq is not None and frame.seq == self.last_seq + 1
+        self.last_seq = frame.seq
+        if in_sequence and frame.delta is not None:
+            return frame.delta
+        return frame.key
+
+    def close(self):
+        '''stop sending, the sender greenlet then closes the socket'''
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.ready.set()
+        self.hub.unsubscribe(self)
+
+
+class BroadcastHub():
+    '''fans status frames out to websocket clients.
+
+       publish() may be called from any thread, e.g. the OvenWatcher. the
+       frame is encoded once by the caller and handed to the gevent hub
+       through an async watcher, which queues it for every subscriber.
+       a subscriber whose queue is full either loses its oldest frame or
+       is disconnected, so a slow client never holds up the others.
+       create it in the thread that runs the gevent hub.'''
+
+    def __init__(self, maxsize=20, policy=DROP_OLDEST):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.subscribers = []
+        self.incoming = collections.deque()
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.bytes_sent = 0
+        self.watcher = gevent.get_hub().loop.async_()
+        self.watcher.start(self.drain)
+
+    def publish(self, frame):
+        '''thread safe, frame is a StatusFrame or str/bytes ready to send'''
+        self.incoming.append(frame)
+        self.watcher.send()
+
+    def drain(self):
+        while self.incoming:
+            frame = self.incoming.popleft()
+            self.published += 1
+            for subscriber in self.subscribers[:]:
+                subscriber.offer(frame)
+
+    def subscribe(self, wsock, first_frame=None, version=1) -> Subscriber:
+        '''call from a greenlet. first_frame, e.g. the backlog, is queued
+           ahead of any status frame regardless of the queue size'''
+        subscriber = Subscriber(
+            self, wsock, self.maxsize, self.policy, version)
+        if first_frame is not None:
+            subscriber.offer(first_frame, force=True)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped': self.dropped,
+            'disconnected': self.disconnected,
+            'bytes_sent': self.bytes_sent,
+            'queue_depths': [len(s.queue) for s in self.subscribers],
+        }
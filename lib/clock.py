@@ -0,0 +1,129 @@
+import datetime
+import threading
+import time
+
+
+class Clock():
+    '''wall clock. the oven, zones, pid and watcher get the time and
+       sleep through one of these so a simulation can swap in a
+       VirtualClock and run a firing faster than real time'''
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now()
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def wait(self, seconds: float):
+        if seconds > 0:
+            self._event.wait(seconds)
+
+
+class VirtualClock(Clock):
+    '''simulated time that only moves forward when wait() is called.
+
+       with speedup=None a wait returns immediately, so a profile runs as
+       fast as the cpu allows. with a speedup factor each wait also sleeps
+       seconds / speedup of real time. only one thread should drive it.'''
+
+    def __init__(self, start: datetime.datetime = None, speedup: float = None):
+        Clock.__init__(self)
+        if start is None:
+            start = datetime.datetime.now()
+        self._start = start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+        self.speedup = speedup
+
+    def now(self) -> datetime.datetime:
+        return self._start + datetime.timedelta(seconds=self._elapsed)
+
+    def time(self) -> float:
+        return self._start.timestamp() + self._elapsed
+
+    def monotonic(self) -> float:
+        return self._elapsed
+
+    def wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        if self.speedup:
+            self._event.wait(seconds / self.speedup)
+        with self._lock:
+            self._elapsed += seconds
+
+
+class LoopTimer():
+    '''paces a loop on absolute deadlines, period seconds apart, so the
+       time the loop body takes does not add up over a long run.
+
+       a body that runs past the next deadline counts as an overrun and
+       the deadlines it covered are skipped (missed), keeping the loop on
+       its original grid. wait() also records how late each wakeup was
+       and how long the body took.'''
+
+    def __init__(self, period: float, clock: Clock = None):
+        self.period = period
+        self.clock = clock if clock is not None else Clock()
+        self.reset()
+
+    def reset(self):
+        self.deadline = None
+        self.last_wake = None
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+        self.busy_total = 0.0
+        self.busy_max = 0.0
+        self.period_error_max = 0.0
+
+    def wait(self):
+        now = self.clock.monotonic()
+        deadline = self.deadline
+        if deadline is None:
+            deadline = now
+        else:
+            busy = now - self.last_wake
+            self.busy_total += busy
+            self.busy_max = max(self.busy_max, busy)
+        deadline += self.period
+        if now > deadline:
+            missed = int((now - deadline) // self.period) + 1
+            self.overruns += 1
+            self.missed += missed
+            deadline += missed * self.period
+        self.deadline = deadline
+        self.clock.wait(deadline - now)
+
+        woke = self.clock.monotonic()
+        late = max(woke - deadline, 0.0)
+        self.late_total += late
+        self.late_max = max(self.late_max, late)
+        if self.last_wake is not None:
+            error = abs(woke - self.last_wake - self.period)
+            self.period_error_max = max(self.period_error_max, error)
+        self.last_wake = woke
+        self.ticks += 1
+
+    def stats(self) -> dict:
+        ticks = max(self.ticks, 1)
+        return {
+            'period': self.period,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'missed': self.missed,
+            'late_ms_mean': round(self.late_total / ticks * 1000, 2),
+            'late_ms_max': round(self.late_max * 1000, 2),
+            # the first wait has no loop body before it
+            'busy_ms_mean': round(self.busy_total / max(ticks - 1, 1) * 1000, 2),
+            'busy_ms_max': round(self.busy_max * 1000, 2),
+            'period_error_ms_max': round(self.period_error_max * 1000, 2),
+        }
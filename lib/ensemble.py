@@ -0,0 +1,229 @@
+import itertools
+import logging
+
+import numpy as np
+
+from lib.oven import Profile
+
+log = logging.getLogger(__name__)
+
+# parameters that may differ between members of an ensemble,
+# everything else comes from config
+SWEEP_PARAMS = ('pid_kp', 'pid_ki', 'pid_kd',
+                'zone_max_lag', 'kiln_must_catch_up_max_error')
+
+
+def grid(**values) -> dict:
+    '''cartesian product of parameter lists, e.g.
+       grid(pid_kp=[10, 25], pid_kd=[100, 200]) -> 4 members'''
+    names = list(values.keys())
+    rows = list(itertools.product(*[values[n] for n in names]))
+    return {n: np.array([r[i] for r in rows], dtype=float)
+            for i, n in enumerate(names)}
+
+
+class EnsembleSimulator():
+    '''runs the SimulatedOven/SimulatedZone model and the oven's PID and
+       zone balancing logic for many independent parameter sets at once.
+
+       state is held in arrays of shape (members,) or (members, zones) and
+       every member advances one time_step per step(), so a whole grid of
+       pid/zone settings can be fired against a profile in one pass.
+       the arithmetic follows Oven.tick() and SimulatedZone.temp_changes()
+       step for step, only the random zone divergence uses numpy's
+       generator instead of python's.'''
+
+    def __init__(self, config, profile: Profile, params: dict, seed=None):
+        self.profile = profile
+        self.time_step = config.sensor_time_wait
+        self.zone_count = len(config.zones)
+        self.emergency_shutoff_temp = config.emergency_shutoff_temp
+        self.kiln_must_catch_up = config.kiln_must_catch_up
+        self.stop_integral_windup = config.stop_integral_windup
+
+        sizes = set(len(v) for v in params.values())
+        if len(sizes) > 1:
+            raise ValueError("all swept parameters need the same length")
+        self.size = sizes.pop() if sizes else 1
+        for name in params:
+            if name not in SWEEP_PARAMS:
+                raise ValueError("%s can not be swept" % (name,))
+        self.params = {}
+        for name in SWEEP_PARAMS:
+            value = params.get(name, getattr(config, name))
+            self.params[name] = np.broadcast_to(
+                np.asarray(value, dtype=float), (self.size,)).copy()
+
+        self.t_env = config.sim_t_env
+        self.c_heat = config.sim_c_heat
+        self.c_oven = config.sim_c_oven
+        self.p_heat = config.sim_p_heat
+        self.R_o_nocool = config.sim_R_o_nocool
+        self.R_ho = config.sim_R_ho_noair
+
+        self.times = np.array([t for (t, x) in profile.data], dtype=float)
+        self.temps = np.array([x for (t, x) in profile.data], dtype=float)
+        self.totaltime = self.times[-1]
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        n, z = self.size, self.zone_count
+        self.elapsed = 0.0
+        self.t = np.full((n, z), self.t_env)
+        self.t_h = np.full((n, z), self.t_env)
+        self.shift = np.zeros(n)
+        self.runtime = np.zeros(n)
+        self.target = np.zeros(n)
+        self.iterm = np.zeros(n)
+        self.last_err = np.zeros(n)
+        self.running = np.ones(n, dtype=bool)
+        self.emergency = np.zeros(n, dtype=bool)
+        self.ticks = np.zeros(n, dtype=int)
+        self.scored_ticks = np.zeros(n, dtype=int)
+        # accumulated results
+        self.abs_error = np.zeros(n)
+        self.max_overshoot = np.full(n, -np.inf)
+        self.max_spread = np.zeros(n)
+        self.energy = np.zeros(n)
+
+    def _is_ramping_up(self, runtime):
+        i = np.searchsorted(self.times, runtime, side='right')
+        i = np.clip(i, 1, len(self.times) - 1)
+        return self.temps[i] > self.temps[i - 1]
+
+    def _stats_temps(self):
+        # the zone table rounds temperatures, the oven averages those
+        temps = np.round(self.t, 1)
+        return temps, np.round(temps.mean(axis=1), 2)
+
+    def step(self):
+        '''advance every running member by one time_step, see Oven.tick()'''
+        active = self.running
+        p = self.params
+        self.elapsed += self.time_step
+        _, avg = self._stats_temps()
+
+        if self.kiln_must_catch_up:
+            max_error = p['kiln_must_catch_up_max_error']
+            ramping = self._is_ramping_up(self.runtime)
+            too_cold = (self.target - avg > max_error) & ramping
+            too_hot = (avg - self.target > max_error) & ~ramping
+            self.shift += np.where(active & (too_cold | too_hot),
+                                   self.time_step, 0.0)
+
+        runtime = np.maximum(self.elapsed - self.shift, 0.0)
+        self.runtime = np.where(active, runtime, self.runtime)
+        target = np.interp(self.runtime, self.times, self.temps)
+        self.target = np.where(self.runtime > self.totaltime, 0.0, target)
+
+        pid = self._compute_pid(avg, active)
+        temperature = avg
+        # Oven.tick() decides every zone from one snapshot
+        temps, _ = self._stats_temps()
+        temp_range = temps.max(axis=1) - temps.min(axis=1)
+        for zone in range(self.zone_count):
+            zone_pid = np.clip(
+                self._zone_pid(pid, zone, temperature, temp_range), 0, 1)
+            heat = np.where(active, self.time_step * zone_pid, 0.0)
+            self._temp_changes(zone, heat, active)
+            self.energy += self.p_heat * heat
+
+        temps, avg = self._stats_temps()
+        # the tick past the end of the schedule has a target of 0
+        scored = active & (self.runtime <= self.totaltime)
+        error = avg - self.target
+        self.abs_error += np.where(scored, np.abs(error), 0.0)
+        self.max_overshoot = np.where(
+            scored, np.maximum(self.max_overshoot, error), self.max_overshoot)
+        spread = temps.max(axis=1) - temps.min(axis=1)
+        self.max_spread = np.where(
+            scored, np.maximum(self.max_spread, spread), self.max_spread)
+        self.scored_ticks += scored
+        self.ticks += active
+
+        emergency = active & (self.t >= self.emergency_shutoff_temp).any(axis=1)
+        self.emergency |= emergency
+        self.running = active & ~emergency & (self.runtime <= self.totaltime)
+
+    def _compute_pid(self, ispoint, active):
+        '''PID.compute() for all members, timeDelta is always time_step'''
+        p = self.params
+        window_size = 100
+        error = self.target - ispoint
+        d_err = (error - self.last_err) / self.time_step
+        output = p['pid_kp'] * error + self.iterm + p['pid_kd'] * d_err
+        out4logs = output
+        output = np.clip(output, -window_size, window_size)
+        self.last_err = np.where(active, error, self.last_err)
+        output = np.maximum(output, 0) / window_size
+
+        ki = p['pid_ki']
+        integrate = active & (ki > 0) & (out4logs < 120)
+        if self.stop_integral_windup:
+            integrate &= np.abs(p['pid_kp'] * error) < window_size
+        safe_ki = np.where(ki > 0, ki, 1.0)
+        self.iterm += np.where(
+            integrate, error * self.time_step * (1 / safe_ki), 0.0)
+        return output
+
+    def _zone_pid(self, pid, zone, temperature, temp_range):
+        '''Oven.calc_zone_pid() for one zone of every member'''
+        max_lag = self.params['zone_max_lag']
+        zone_temp = self.t[:, zone]
+        zone_error = zone_temp - self.target
+        heating = np.select(
+            [
+                zone_error > max_lag,
+                (zone_temp > self.target) & (temp_range > max_lag * 2),
+                (zone_temp > temperature) & (temp_range > max_lag),
+                zone_error < 0 - max_lag,
+            ],
+            [pid * 0.8, pid * 0.9, pid * 0.95, pid * 2.5],
+            default=pid)
+        idle = np.where(zone_error < 0 - max_lag, 0.15, 0.0)
+        return np.where(pid <= 0, idle, heating)
+
+    def _temp_changes(self, zone, heat, active):
+        '''SimulatedZone.temp_changes() for one zone of every member'''
+        t = self.t[:, zone]
+        t_h = self.t_h[:, zone] + self.p_heat * heat / self.c_heat
+
+        p_ho = (t_h - t) / self.R_ho
+        t = t + p_ho * self.time_step / self.c_oven
+        t_h = t_h - p_ho * self.time_step / self.c_heat
+
+        p_env = (t - self.t_env) / self.R_o_nocool
+        t = t - p_env * self.time_step / self.c_oven
+
+        # zone divergence - assumes zone 0 is on top
+        t = t - self.rng.integers(0, 11, size=self.size) / 10 * zone
+
+        self.t[:, zone] = np.where(active, t, self.t[:, zone])
+        self.t_h[:, zone] = np.where(active, t_h, self.t_h[:, zone])
+
+    def run(self, max_runtime: float = None) -> dict:
+        '''step until every member finished the schedule, hit the emergency
+           shutoff or max_runtime seconds of kiln time passed'''
+        while self.running.any():
+            self.step()
+            if max_runtime is not None and self.elapsed > max_runtime:
+                log.warning("ensemble exceeded %ds of kiln time, stopping" %
+                            (max_runtime,))
+                break
+        return self.results()
+
+    def results(self) -> dict:
+        ticks = np.maximum(self.scored_ticks, 1)
+        results = {name: value.copy() for name, value in self.params.items()}
+        results.update({
+            'finished': ~self.running & ~self.emergency,
+            'emergency': self.emergency.copy(),
+            'runtime': self.ticks * self.time_step,
+            'catch_up': self.shift.copy(),
+            'mean_abs_error': self.abs_error / ticks,
+            'max_overshoot': self.max_overshoot.copy(),
+            'max_zone_spread': self.max_spread.copy(),
+            'kwh': self.energy / 3.6e6,
+        })
+        return results
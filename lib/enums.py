@@ -5,3 +5,9 @@ class BoardModel(Enum):
     Unknown = auto()
     MAX31855 = auto()
     MAX31856 = auto()
+
+
+class SegmentType(Enum):
+    Ramp = auto()
+    Hold = auto()
+    Cool = auto()
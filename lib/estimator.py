@@ -0,0 +1,60 @@
+class KalmanEstimator():
+    '''temperature and heating rate of one zone from its noisy readings.
+
+       the state is [temperature, rate]. between readings the temperature
+       moves on at the current rate and a change of the commanded heater
+       duty (0-1) changes the rate by duty_rate per unit of duty. readings
+       then pull the state back according to how noisy they are.
+       process_noise is how much the rate can wander on its own, in
+       degrees^2/s^3. measurement_noise is the standard deviation of a
+       reading in degrees. rates are in degrees per second.'''
+
+    def __init__(self, process_noise: float = 1e-4, measurement_noise: float = 1.0,
+                 duty_rate: float = 0.2):
+        self.q = process_noise
+        self.r = measurement_noise ** 2
+        self.duty_rate = duty_rate
+        self.reset()
+
+    def reset(self):
+        self.temperature = None
+        self.rate = 0.0
+        self.duty = 0.0
+        self.last = None
+        self.p00 = self.p01 = self.p11 = 0.0
+
+    def update(self, measured: float, duty: float, now: float):
+        '''feed one reading taken at now (monotonic seconds) while the
+           heater was driven at duty, returns (temperature, rate)'''
+        if self.temperature is None:
+            self.temperature = measured
+            self.duty = duty
+            self.last = now
+            self.p00 = self.r
+            # the rate is unknown, about one degree per second either way
+            self.p11 = 1.0
+            return self.temperature, self.rate
+
+        dt = now - self.last
+        self.last = now
+        q = self.q
+
+        # predict
+        self.temperature += self.rate * dt
+        self.rate += self.duty_rate * (duty - self.duty)
+        self.duty = duty
+        p00 = self.p00 + dt * 2 * self.p01 + dt * dt * self.p11 + q * dt ** 3 / 3
+        p01 = self.p01 + dt * self.p11 + q * dt * dt / 2
+        p11 = self.p11 + q * dt
+
+        # correct
+        s = p00 + self.r
+        k0 = p00 / s
+        k1 = p01 / s
+        residual = measured - self.temperature
+        self.temperature += k0 * residual
+        self.rate += k1 * residual
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        return self.temperature, self.rate
@@ -0,0 +1,353 @@
+import random
+import threading
+import collections
+from types import SimpleNamespace
+
+from lib.clock import Clock
+
+# MAX31856 registers and bits, see the datasheet
+CR0 = 0x00
+CR1 = 0x01
+CJHF = 0x03
+CJLF = 0x04
+LTHFTH = 0x05
+LTLFTH = 0x07
+CJTH = 0x0A
+LTCBH = 0x0C
+LTCBL = 0x0E
+SR = 0x0F
+CR0_AUTOCONVERT = 0x80
+CR0_1SHOT = 0x40
+CR0_CJ = 0x08
+CR0_FAULTCLR = 0x02
+CR0_AC50HZ = 0x01
+FAULT_TCRANGE = 0x40
+FAULT_CJHIGH = 0x20
+FAULT_CJLOW = 0x10
+FAULT_TCHIGH = 0x08
+FAULT_TCLOW = 0x04
+FAULT_OPEN = 0x01
+# power on values of CR0 to SR
+REGISTER_DEFAULTS = (0x00, 0x03, 0xFF, 0x7F, 0xC0, 0x7F, 0xFF, 0x80,
+                     0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00)
+
+
+def _signed(value, bits):
+    if value & (1 << (bits - 1)):
+        value -= 1 << bits
+    return value
+
+
+class FakePin():
+    '''one gpio line. every change is recorded as (monotonic, value) in
+       edges. fake devices drive their outputs with drive(), a device set
+       as driver is brought up to date whenever the line is read'''
+
+    def __init__(self, board, name, edge_history=100000):
+        self.board = board
+        self.name = name
+        self.driver = None
+        self._value = False
+        self.edges = collections.deque(maxlen=edge_history)
+
+    def __repr__(self) -> str:
+        return self.name
+
+    @property
+    def value(self) -> bool:
+        if self.driver is not None:
+            self.driver.update()
+        return self._value
+
+    def drive(self, value: bool):
+        value = bool(value)
+        if value != self._value:
+            self._value = value
+            self.edges.append((self.board.clock.monotonic(), value))
+
+    def high_time(self, start: float = None, end: float = None) -> float:
+        '''seconds the line was high between start and end (monotonic),
+           e.g. how long a heater was on'''
+        if end is None:
+            end = self.board.clock.monotonic()
+        if start is None:
+            start = float('-inf')
+        total = 0.0
+        since = None
+        for stamp, value in self.edges:
+            if value:
+                since = stamp
+            elif since is not None:
+                total += max(0.0, min(stamp, end) - max(since, start))
+                since = None
+        if since is not None:
+            total += max(0.0, end - max(since, start))
+        return total
+
+
+class Direction():
+    INPUT = 0
+    OUTPUT = 1
+
+
+class Pull():
+    UP = 1
+    DOWN = 2
+
+
+class DigitalInOut():
+    '''digitalio.DigitalInOut on a FakePin'''
+
+    def __init__(self, pin: FakePin):
+        self.pin = pin
+        self.direction = Direction.INPUT
+        self.pull = None
+
+    @property
+    def value(self) -> bool:
+        return self.pin.value
+
+    @value.setter
+    def value(self, value):
+        if self.direction != Direction.OUTPUT:
+            raise AttributeError("Cannot set value when direction is input.")
+        self.pin.drive(value)
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        self.direction = Direction.OUTPUT
+        self.value = value
+
+    def switch_to_input(self, pull=None):
+        self.direction = Direction.INPUT
+        self.pull = pull
+
+    def deinit(self):
+        pass
+
+
+digitalio = SimpleNamespace(DigitalInOut=DigitalInOut, Direction=Direction, Pull=Pull)
+
+
+class FakeMAX31856():
+    '''a MAX31856 at the register level.
+
+       reads and writes auto increment from the address byte like the
+       chip does. a one-shot conversion, or each conversion in automatic
+       mode, takes the datasheet conversion time for the configured
+       averaging and mains filter on the board clock, only then are
+       temperature and reference latched into the result registers, with
+       gaussian noise of noise degrees on the temperature. set faults to
+       inject status bits, e.g. FAULT_OPEN. the threshold bits follow the
+       threshold registers. drdy, when given, is driven low when a result
+       is ready and back high when it is read.'''
+
+    def __init__(self, board, temperature: float = 20.0, reference: float = 20.0,
+                 drdy: FakePin = None, noise: float = 0.05, seed: int = 0):
+        self.board = board
+        self.temperature = temperature
+        self.reference = reference
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.faults = 0
+        self.drdy = drdy
+        self.registers = bytearray(REGISTER_DEFAULTS)
+        self.done = None
+        self.conversions = 0
+        self.address = None
+        self.writing = False
+        if drdy is not None:
+            drdy.driver = self
+            drdy.drive(True)
+
+    def conversion_time(self, continuous: bool) -> float:
+        from lib.max31856 import conversion_time
+        return conversion_time(self.registers[CR1] & 0x70,
+                               bool(self.registers[CR0] & CR0_AC50HZ), continuous)
+
+    def select(self):
+        self.address = None
+
+    def write(self, data):
+        for byte in data:
+            if self.address is None:
+                self.writing = bool(byte & 0x80)
+                self.address = byte & 0x0F
+                continue
+            if self.writing:
+                self.write_register(self.address, byte)
+            self.address = (self.address + 1) & 0x0F
+
+    def read(self, count: int) -> bytes:
+        self.update()
+        data = bytearray(count)
+        for i in range(count):
+            if LTCBH <= self.address <= LTCBL and self.drdy is not None:
+                self.drdy.drive(True)
+            data[i] = self.registers[self.address]
+            self.address = (self.address + 1) & 0x0F
+        return data
+
+    def write_register(self, address: int, value: int):
+        self.update()
+        if address >= LTCBH:
+            # results and status are read only
+            return
+        if address != CR0:
+            self.registers[address] = value
+            return
+        now = self.board.clock.monotonic()
+        was_automatic = self.registers[CR0] & CR0_AUTOCONVERT
+        if value & CR0_FAULTCLR:
+            self.registers[SR] = 0
+        self.registers[CR0] = value & ~CR0_FAULTCLR
+        if value & CR0_AUTOCONVERT:
+            if not was_automatic:
+                self.done = now + self.conversion_time(True)
+        elif value & CR0_1SHOT:
+            self.done = now + self.conversion_time(False)
+            if self.drdy is not None:
+                self.drdy.drive(True)
+        else:
+            self.done = None
+
+    def update(self):
+        '''latch every conversion that has finished by now'''
+        if self.done is None:
+            return
+        now = self.board.clock.monotonic()
+        if now < self.done:
+            return
+        if self.registers[CR0] & CR0_AUTOCONVERT:
+            # the chip keeps converting, only the latest result is kept
+            period = self.conversion_time(True)
+            finished = int((now - self.done) / period) + 1
+            self.done += finished * period
+            self.conversions += finished
+        else:
+            self.done = None
+            self.registers[CR0] &= ~CR0_1SHOT
+            self.conversions += 1
+        self.latch()
+
+    def latch(self):
+        registers = self.registers
+        faults = self.faults
+        temperature = self.temperature
+        if self.noise:
+            temperature += self.random.gauss(0, self.noise)
+        # 19 bits of 1/128 degree, left aligned in 24
+        raw = int(round(temperature * 128))
+        if not -(1 << 18) <= raw < (1 << 18):
+            faults |= FAULT_TCRANGE
+            raw = max(-(1 << 18), min(raw, (1 << 18) - 1))
+        raw = (raw << 5) & 0xFFFFFF
+        registers[LTCBH:LTCBL + 1] = raw.to_bytes(3, 'big')
+        if not registers[CR0] & CR0_CJ:
+            # 14 bits of 1/64 degree, left aligned in 16
+            cj = (int(round(self.reference * 64)) << 2) & 0xFFFF
+            registers[CJTH:CJTH + 2] = cj.to_bytes(2, 'big')
+        high = _signed(registers[LTHFTH] << 8 | registers[LTHFTH + 1], 16) / 16
+        low = _signed(registers[LTLFTH] << 8 | registers[LTLFTH + 1], 16) / 16
+        if temperature > high:
+            faults |= FAULT_TCHIGH
+        if temperature < low:
+            faults |= FAULT_TCLOW
+        if self.reference > _signed(registers[CJHF], 8):
+            faults |= FAULT_CJHIGH
+        if self.reference < _signed(registers[CJLF], 8):
+            faults |= FAULT_CJLOW
+        registers[SR] = faults
+        if self.drdy is not None:
+            self.drdy.drive(False)
+
+
+class FakeSPI():
+    '''busio.SPI with a fake device behind every chip select. a chip
+       select nothing was attached to gets a FakeMAX31856 at 20 degrees'''
+
+    def __init__(self, board):
+        self.board = board
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.transfers = 0
+
+    def attach(self, cs: FakePin, device):
+        self.devices[cs] = device
+        return device
+
+    def device(self, cs: FakePin):
+        device = self.devices.get(cs)
+        if device is None:
+            device = self.attach(cs, FakeMAX31856(self.board))
+        return device
+
+
+class SPIDevice():
+    '''adafruit_bus_device.spi_device.SPIDevice on a FakeSPI'''
+
+    def __init__(self, spi: FakeSPI, chip_select: DigitalInOut, *,
+                 cs_active_value=False, baudrate=100000, polarity=0, phase=0,
+                 extra_clocks=0):
+        self.spi = spi
+        self.chip_select = chip_select
+        self.cs_active_value = cs_active_value
+        self.baudrate = baudrate
+        self.target = spi.device(chip_select.pin)
+        chip_select.switch_to_output(value=not cs_active_value)
+
+    def __enter__(self):
+        self.spi.lock.acquire()
+        self.chip_select.value = self.cs_active_value
+        self.target.select()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.chip_select.value = not self.cs_active_value
+        self.spi.lock.release()
+        return False
+
+    def write(self, buf, *, start=0, end=None):
+        self.spi.transfers += 1
+        self.target.write(bytes(buf[start:end]))
+
+    def readinto(self, buf, *, start=0, end=None, write_value=0):
+        if end is None:
+            end = len(buf)
+        self.spi.transfers += 1
+        buf[start:end] = self.target.read(end - start)
+
+
+class FakeBoard():
+    '''board: any pin name (D5, D26, ...) is a FakePin, SPI() is the one
+       shared bus. time comes from clock, swap in a VirtualClock to run
+       conversions and record edges on simulated time'''
+
+    def __init__(self, clock: Clock = None):
+        self.clock = clock if clock is not None else Clock()
+        self.reset()
+
+    def reset(self):
+        '''forget every pin, edge and device'''
+        self.pins = {}
+        self.spi = FakeSPI(self)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        pin = self.pins.get(name)
+        if pin is None:
+            pin = self.pins[name] = FakePin(self, name)
+        return pin
+
+    def SPI(self) -> FakeSPI:
+        return self.spi
+
+    def thermocouple(self, cs: FakePin, drdy: FakePin = None,
+                     temperature: float = 20.0, noise: float = 0.05) -> FakeMAX31856:
+        '''attach a FakeMAX31856 to chip select cs, before the driver is
+           created, to control its temperature and faults'''
+        return self.spi.attach(cs, FakeMAX31856(
+            self, temperature, drdy=drdy, noise=noise, seed=len(self.spi.devices)))
+
+
+board = FakeBoard()
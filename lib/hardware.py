@@ -0,0 +1,76 @@
+import os
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class Backend():
+    '''the board, digitalio and SPIDevice the controller drives the kiln
+       through, and the Pin type of board's pins. error is why auto fell
+       back to the fake backend, None when it was chosen'''
+    __slots__ = ('name', 'board', 'digitalio', 'SPIDevice', 'Pin', 'error')
+
+    def __init__(self, name, board, digitalio, SPIDevice, Pin):
+        self.name = name
+        self.board = board
+        self.digitalio = digitalio
+        self.SPIDevice = SPIDevice
+        self.Pin = Pin
+        self.error = None
+
+
+def real() -> Backend:
+    '''Adafruit Blinka on a raspberry pi'''
+    import board
+    import digitalio
+    from microcontroller import Pin
+    from adafruit_bus_device.spi_device import SPIDevice
+    return Backend('real', board, digitalio, SPIDevice, Pin)
+
+
+def fake() -> Backend:
+    '''the in process stand in of lib/fakeHardware.py'''
+    from lib import fakeHardware
+    return Backend('fake', fakeHardware.board, fakeHardware.digitalio,
+                   fakeHardware.SPIDevice, fakeHardware.FakePin)
+
+
+BACKENDS = {
+    'real': real,
+    'fake': fake,
+}
+
+
+def load(name: str) -> Backend:
+    '''auto is the real backend where its libraries import, else the fake.
+       a RealOven refuses to run on a fake backend auto fell back to, only
+       simulations and benchmarks can'''
+    if name == 'auto':
+        try:
+            return real()
+        except (ImportError, NotImplementedError, RuntimeError) as e:
+            # blinka raises NotImplementedError on boards it does not know
+            log.info("no hardware libraries (%s), using fake hardware" % (e,))
+            backend = fake()
+            backend.error = e
+            return backend
+    if name not in BACKENDS:
+        raise ValueError("unknown hardware backend %s, one of %s" %
+                         (name, ', '.join(['auto'] + list(BACKENDS))))
+    return BACKENDS[name]()
+
+
+def use(name: str) -> Backend:
+    '''switch backend, before config is imported and the oven is created.
+       code reading hardware.board etc. at call time follows the switch'''
+    global backend, board, digitalio, SPIDevice, Pin
+    backend = load(name)
+    board = backend.board
+    digitalio = backend.digitalio
+    SPIDevice = backend.SPIDevice
+    Pin = backend.Pin
+    return backend
+
+
+# KILN_HARDWARE=real|fake|auto
+use(os.environ.get('KILN_HARDWARE') or 'auto')
@@ -1,7 +1,8 @@
 import logging
 import time
 
-from microcontroller import Pin
+from lib import hardware
+from lib.hardware import Pin
 
 log = logging.getLogger(__name__)
 
@@ -15,9 +16,7 @@ class Heater(object):
 
     def load_libs(self):
         try:
-
-            import digitalio
-
+            digitalio = hardware.digitalio
             GPIO = digitalio.DigitalInOut(self.gpio_heat)
             GPIO.direction = digitalio.Direction.OUTPUT
             GPIO.value = not self._active_value  # default to off
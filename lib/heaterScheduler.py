@@ -0,0 +1,259 @@
+import threading
+import logging
+from collections import deque
+
+from lib.clock import Clock
+
+log = logging.getLogger(__name__)
+
+
+class HeaterScheduler(threading.Thread):
+    '''switches the heater of every zone from one thread.
+
+       at the start of each period, on an absolute monotonic deadline,
+       the heat each zone asked for through heat_for() is turned into an
+       on window within the period, rounded to resolution seconds. the
+       edges of all zones are then executed in time order. a zone that
+       stays on across the period boundary is not switched off and on
+       again. the on time actually delivered is measured per zone and
+       stored on the zone as delivered (last period) and on_time (total).
+
+       windows are staggered around the period, which wraps, so as few
+       elements as possible are on at once. zones are weighted by their
+       watts (1 when unknown). with max_load set, a window that can not be
+       placed without exceeding max_load watts is shortened until it fits,
+       counted in limited.
+
+       a period that fails switches every heater off, is counted in errors
+       and the next period is tried again. cancel() switches every heater
+       off at once, and a planned on edge only fires if the zone still
+       wants heat, so a reset or shutdown within a period sticks.'''
+
+    def __init__(self, zones, period: float, resolution: float = 0.1,
+                 max_load: float = None, clock: Clock = None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.name = "heaters"
+        self.zones = list(zones)
+        self.heated = [z for z in self.zones if z.output is not None]
+        self.period = period
+        self.resolution = resolution
+        self.slots = max(1, round(period / resolution))
+        self.max_load = max_load
+        self.load = [0.0] * self.slots
+        self.limited = 0
+        self.limiting = set()
+        self.clock = clock if clock is not None else Clock()
+        if max_load is not None and any(z.watts is None for z in self.heated):
+            log.warning("max_load is set but not every heated zone has watts")
+        # switch() and all_off() run in this thread and in cancel()'s
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.on_since = {}
+        self.period_on = {}
+        self.periods = 0
+        self.overruns = 0
+        self.errors = 0
+
+    def on_slots(self, zone) -> int:
+        '''requested on time of zone for the coming period in slots of
+           resolution seconds'''
+        if zone._tuning:
+            return self.slots
+        heat = min(max(zone.heat, 0), self.period)
+        return round(heat / self.resolution)
+
+    def place(self, length: int, watts: float):
+        '''start slot of the window of length slots that keeps the peak
+           load lowest, then overlaps the least. returns (start, peak).
+           one pass over the slots, a sliding window maximum for the peak
+           and prefix sums for the overlap'''
+        n = self.slots
+        ring = self.load + self.load[:length - 1]
+        prefix = [0.0]
+        for value in ring:
+            prefix.append(prefix[-1] + value)
+        window = deque()
+        best = None
+        for i, value in enumerate(ring):
+            while window and ring[window[-1]] <= value:
+                window.pop()
+            window.append(i)
+            start = i - length + 1
+            if window[0] < start:
+                window.popleft()
+            if start < 0:
+                continue
+            key = (ring[window[0]] + watts, prefix[i + 1] - prefix[start])
+            if best is None or key < best[0]:
+                best = (key, start)
+            if start == n - 1:
+                break
+        return best[1], best[0][0]
+
+    def fit(self, length: int, watts: float):
+        '''longest window shorter than length that stays under max_load,
+           as (start, length), (0, 0) when none does. a longer window never
+           has a lower peak, so the length is found by bisection'''
+        best = (0, 0)
+        lo, hi = 1, length - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            start, peak = self.place(mid, watts)
+            if peak <= self.max_load:
+                best = (start, mid)
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return best
+
+    def plan(self) -> list:
+        '''(on, off, zone) slots into the period for every heated zone.
+           off can be past the last slot, the window then wraps around to
+           the start. on == off means the zone stays off'''
+        n = self.slots
+        self.load = [0.0] * n
+        requests = [(self.on_slots(zone), i, zone)
+                    for i, zone in enumerate(self.heated)]
+        # longest windows first, they are the hardest to fit
+        requests.sort(key=lambda r: (-r[0], r[1]))
+        windows = []
+        for length, i, zone in requests:
+            watts = zone.watts if zone.watts is not None else 1.0
+            if length >= n:
+                start = 0
+                length = n
+                peak = max(self.load) + watts
+            elif length > 0:
+                start, peak = self.place(length, watts)
+            else:
+                self.limiting.discard(zone)
+                windows.append((0, 0, zone))
+                continue
+            if self.max_load is not None and peak > self.max_load:
+                self.limited += 1
+                if zone not in self.limiting:
+                    # once when it starts, not every period
+                    self.limiting.add(zone)
+                    log.warning("zone %s on time cut to stay under %dW" %
+                                (zone.zone_name, self.max_load))
+                start, length = self.fit(length, watts)
+                if length == 0:
+                    windows.append((0, 0, zone))
+                    continue
+            elif zone in self.limiting:
+                self.limiting.discard(zone)
+                log.info("zone %s no longer cut by max_load" % (zone.zone_name,))
+            for k in range(length):
+                self.load[(start + k) % n] += watts
+            windows.append((start, start + length, zone))
+        return windows
+
+    def edges(self, windows) -> list:
+        '''(offset, value, zone) sorted by time, switching off first. the
+           windows are compared in whole slots and only turned into
+           seconds here, so rounding can not make a zero width pulse'''
+        n = self.slots
+        edges = []
+        for on, off, zone in windows:
+            if off <= on:
+                edges.append((0, False, zone))
+                continue
+            if off > n:
+                # wraps, on from the start of the period until the rest
+                edges.append((0, True, zone))
+                edges.append((off - n, False, zone))
+            elif on > 0:
+                edges.append((0, False, zone))
+            edges.append((on, True, zone))
+            if off < n:
+                edges.append((off, False, zone))
+        edges.sort(key=lambda e: (e[0], e[1]))
+        return [(slot * self.resolution, value, zone)
+                for slot, value, zone in edges]
+
+    @staticmethod
+    def wants_heat(zone) -> bool:
+        return zone._tuning or zone.heat > 0
+
+    def switch(self, zone, value: bool, stamp: float):
+        if value == (zone in self.on_since):
+            return
+        if value and (self.cancelled or not self.wants_heat(zone)):
+            # reset or switched off since the period was planned
+            return
+        if value:
+            zone.output.on()
+            self.on_since[zone] = stamp
+        else:
+            zone.output.off()
+            self.period_on[zone] += stamp - self.on_since.pop(zone)
+
+    def run_period(self, start: float):
+        for zone in self.zones:
+            zone.publish()
+        self.period_on = {zone: 0.0 for zone in self.heated}
+        self.cancelled = False
+        for offset, value, zone in self.edges(self.plan()):
+            self.clock.wait(start + offset - self.clock.monotonic())
+            with self.lock:
+                self.switch(zone, value, self.clock.monotonic())
+        self.clock.wait(start + self.period - self.clock.monotonic())
+        end = self.clock.monotonic()
+        with self.lock:
+            for zone in self.heated:
+                if zone in self.on_since:
+                    # still on, count up to the boundary and carry on
+                    self.period_on[zone] += end - self.on_since[zone]
+                    self.on_since[zone] = end
+                zone.delivered = self.period_on[zone]
+                zone.on_time += zone.delivered
+        self.periods += 1
+
+    def stats(self) -> dict:
+        return {
+            'periods': self.periods,
+            'overruns': self.overruns,
+            'errors': self.errors,
+            'limited': self.limited,
+        }
+
+    def cancel(self):
+        '''switch every heater off now and keep them off for the rest of
+           the period, for a reset or emergency shutdown'''
+        with self.lock:
+            self.cancelled = True
+            self.all_off()
+
+    def all_off(self):
+        '''switch every heater off, whatever state it was left in'''
+        now = self.clock.monotonic()
+        for zone, since in self.on_since.items():
+            if zone in self.period_on:
+                self.period_on[zone] += now - since
+        self.on_since.clear()
+        for zone in self.heated:
+            try:
+                zone.output.off()
+            except Exception:
+                log.exception("could not switch off heater of zone %s" %
+                              (zone.zone_name,))
+
+    def run(self):
+        deadline = self.clock.monotonic()
+        while True:
+            try:
+                self.run_period(deadline)
+            except Exception:
+                self.errors += 1
+                log.exception("heater period failed, all heaters off")
+                with self.lock:
+                    self.all_off()
+                # sit out the rest of the period instead of spinning
+                self.clock.wait(deadline + self.period - self.clock.monotonic())
+            deadline += self.period
+            # a period always ends a little after its deadline, only
+            # realign when it is late by more than the resolution
+            if self.clock.monotonic() - deadline > self.resolution:
+                self.overruns += 1
+                deadline = self.clock.monotonic()
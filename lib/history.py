@@ -0,0 +1,321 @@
+import os
+import re
+import csv
+import bisect
+import struct
+import logging
+import datetime
+import threading
+import collections
+from array import array
+
+from lib.runlog import read_binary_header, binary_record_format
+
+log = logging.getLogger(__name__)
+
+
+def lttb(x, y, threshold) -> list:
+    '''indices of the points kept by Largest-Triangle-Three-Buckets.
+
+       unlike taking every nth point this keeps the peaks and dips that
+       define the shape of the curve. x must be increasing.'''
+    n = len(x)
+    if threshold >= n or n < 3:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third corner of the triangle
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        count = avg_end - avg_start
+        avg_x = sum(x[avg_start:avg_end]) / count
+        avg_y = sum(y[avg_start:avg_end]) / count
+
+        ax = x[a]
+        ay = y[a]
+        max_area = -1
+        next_a = avg_start - 1
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                next_a = j
+        kept.append(next_a)
+        a = next_a
+    kept.append(n - 1)
+    return kept
+
+
+def list_runs(runlog_path) -> list:
+    '''run ids of every runlog on disk, newest first'''
+    try:
+        files = os.listdir(runlog_path)
+    except OSError:
+        return []
+    runs = set(os.path.splitext(f)[0] for f in files
+               if f.endswith('.csv') or f.endswith('.bin'))
+    return sorted(runs, reverse=True)
+
+
+# Oven.run_profile names runs '%Y%m%d-%H%M-<profile name>'
+RUN_ID = re.compile(r'\d{8}-\d{4}-[^/\\\x00]+')
+
+
+def is_run_id(run_id) -> bool:
+    '''whether run_id can name a runlog, and not a path out of runlog_path'''
+    return RUN_ID.fullmatch(run_id) is not None
+
+
+def load_run(runlog_path, run_id) -> dict:
+    '''{column name: list of values} for a run, the binary runlog is
+       preferred since it needs no parsing. Time is unix seconds.'''
+    for ext in ('.bin', '.csv'):
+        data = runs.load(os.path.join(runlog_path, run_id + ext))
+        if data is not None:
+            return data
+    return None
+
+
+class RunlogEntry():
+    '''a parsed runlog and how far into the file it was parsed'''
+    __slots__ = ('stamp', 'offset', 'columns', 'values', 'dates', 'record',
+                 'data')
+
+    def __init__(self):
+        self.stamp = None
+        self.offset = 0
+        self.columns = None
+        self.values = None
+        self.dates = {}
+        self.record = None
+        self.data = {}
+
+
+class RunCache():
+    '''parsed runlogs by path. like ProfileCatalog a file whose mtime and
+       size did not change is not read again. runlogs are only appended
+       to, so when one grew, e.g. the current run, only the rows written
+       since are parsed. a file that shrank or was replaced is parsed
+       from the start. keeps the size most recently loaded runs.'''
+
+    def __init__(self, size: int = 2):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, path) -> dict:
+        '''the columns of the runlog at path, None if there is none'''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if (entry is None or entry.stamp[0] != stat.st_ino or
+                    stat.st_size < entry.offset):
+                entry = RunlogEntry()
+            if entry.stamp != stamp:
+                if path.endswith('.bin'):
+                    _read_binary(path, entry)
+                else:
+                    _read_csv(path, entry)
+                entry.stamp = stamp
+            self.entries[path] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            return entry.data
+
+
+def _read_binary(path, entry: RunlogEntry):
+    with open(path, 'rb') as f:
+        if entry.record is None:
+            header, entry.offset = read_binary_header(f)
+            entry.columns = header['columns']
+            entry.record = struct.Struct(binary_record_format(entry.columns))
+            entry.values = [[] for c in entry.columns]
+            entry.data = dict(zip(entry.columns, entry.values))
+        f.seek(entry.offset)
+        data = f.read()
+    # a record still being written is read next time
+    usable = len(data) - len(data) % entry.record.size
+    entry.offset += usable
+    rows = zip(*entry.record.iter_unpack(data[:usable]))
+    for column, values in zip(entry.values, rows):
+        column.extend(values)
+
+
+def _read_csv(path, entry: RunlogEntry):
+    with open(path, 'rb') as f:
+        f.seek(entry.offset)
+        data = f.read()
+    # only whole lines, a line still being written is read next time
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return
+    entry.offset += end
+    reader = csv.reader(data[:end].decode('utf-8', 'replace').splitlines())
+    if entry.columns is None:
+        entry.columns = next(reader, [])
+        entry.values = [[] for c in entry.columns]
+        entry.data = dict(zip(entry.columns, entry.values))
+    columns = entry.columns
+    values = entry.values
+    dates = entry.dates
+    skipped = 0
+    for row in reader:
+        if row == columns:
+            continue
+        if len(row) != len(columns):
+            skipped += 1
+            continue
+        try:
+            # 'YYYY-mm-dd HH:MM:SS', parse the date once per day
+            day = row[0][:10]
+            if day not in dates:
+                dates[day] = datetime.datetime.strptime(
+                    day, '%Y-%m-%d').timestamp()
+            parsed = [dates[day] + int(row[0][11:13]) * 3600 +
+                      int(row[0][14:16]) * 60 + int(row[0][17:19])]
+            for i in range(1, len(columns)):
+                parsed.append(float(row[i]))
+        except ValueError:
+            # e.g. the header of a run with other zones
+            skipped += 1
+            continue
+        for column, value in zip(values, parsed):
+            column.append(value)
+    if skipped:
+        log.warning("skipped %d unreadable rows of %s" % (skipped, path))
+
+
+runs = RunCache()
+
+
+def history(data: dict, points: int = 500, start: float = None, end: float = None) -> dict:
+    '''reduce a run to about points per series for plotting.
+
+       time is seconds since the first row. with start and/or end (same
+       unit) the rows inside that window are returned at full resolution.
+       series are Target, AVG and each zone's temperature.'''
+    columns = list(data.keys())
+    times = data[columns[0]] if columns else []
+    t0 = times[0] if times else 0
+    x = [t - t0 for t in times]
+    series_names = columns[1:3] + columns[4::3]
+
+    result = {
+        'columns': series_names,
+        'duration': x[-1] if x else 0,
+        'rows': len(x),
+        'series': {},
+    }
+    if start is not None or end is not None:
+        lo = bisect.bisect_left(x, start) if start is not None else 0
+        hi = bisect.bisect_right(x, end) if end is not None else len(x)
+        window = range(lo, hi)
+        result['window'] = [start, end]
+        for name in series_names:
+            y = data[name]
+            result['series'][name] = [[x[i], round(y[i], 2)] for i in window]
+        return result
+
+    for name in series_names:
+        y = data[name]
+        result['series'][name] = [[x[i], round(y[i], 2)]
+                                  for i in lttb(x, y, points)]
+    return result
+
+
+class HistoryTier():
+    '''fixed size ring of rows, one array('d') per column'''
+
+    def __init__(self, columns, capacity):
+        self.capacity = capacity
+        self.columns = [array('d', bytes(8 * capacity)) for c in range(columns)]
+        self.head = 0
+        self.count = 0
+
+    def append(self, row):
+        '''store row, returns the oldest row if one had to make room'''
+        evicted = None
+        if self.count < self.capacity:
+            i = (self.head + self.count) % self.capacity
+            self.count += 1
+        else:
+            i = self.head
+            evicted = tuple(col[i] for col in self.columns)
+            self.head = (self.head + 1) % self.capacity
+        for col, value in zip(self.columns, row):
+            col[i] = value
+        return evicted
+
+    def rows(self):
+        for n in range(self.count):
+            i = (self.head + n) % self.capacity
+            yield tuple(col[i] for col in self.columns)
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
+class HistoryBuffer():
+    '''fixed memory history of a firing.
+
+       the newest rows are kept at full resolution. rows falling out of a
+       tier are grouped by factor and only the coolest and hottest row of
+       each group move on to the next, coarser tier, so peaks survive the
+       decimation. the oldest tier drops rows once it is full.
+       sort_column is the column compared for coolest and hottest.'''
+
+    def __init__(self, columns, capacity=3600, tiers=4, factor=8, sort_column=1):
+        self.factor = factor
+        self.sort_column = sort_column
+        self.tiers = [HistoryTier(columns, capacity) for t in range(tiers)]
+        self.pending = [[] for t in range(tiers)]
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return (sum(t.count for t in self.tiers) +
+                sum(len(p) for p in self.pending))
+
+    def append(self, row):
+        with self.lock:
+            self._append(0, row)
+
+    def _append(self, level, row):
+        evicted = self.tiers[level].append(row)
+        if evicted is None or level + 1 >= len(self.tiers):
+            return
+        group = self.pending[level]
+        group.append(evicted)
+        if len(group) < self.factor:
+            return
+        key = self.sort_column
+        low = min(range(len(group)), key=lambda i: group[i][key])
+        high = max(range(len(group)), key=lambda i: group[i][key])
+        for i in sorted(set((low, high))):
+            self._append(level + 1, group[i])
+        self.pending[level] = []
+
+    def rows(self) -> list:
+        '''every stored row, oldest first'''
+        rows = []
+        with self.lock:
+            for level in reversed(range(len(self.tiers))):
+                # rows waiting to move down are older than the whole tier
+                rows.extend(self.pending[level])
+                rows.extend(self.tiers[level].rows())
+        return rows
+
+    def clear(self):
+        with self.lock:
+            for tier in self.tiers:
+                tier.clear()
+            self.pending = [[] for t in self.tiers]
@@ -31,8 +31,13 @@ Implementation Notes
 """
 
 from time import sleep
-from micropython import const
-from adafruit_bus_device.spi_device import SPIDevice
+from lib import hardware
+
+try:
+    from micropython import const
+except ImportError:
+    def const(value):
+        return value
 
 try:
     from struct import unpack
@@ -89,6 +94,19 @@ class SampleType:  # pylint: disable=too-few-public-methods
     AVG_SEL_16SAMP = const(0x40)
 
 
+def conversion_time(samples=SampleType.AVG_SEL_1SAMP, ac_freq_50hz=False, continuous=True):
+    """Worst case seconds between two results from the datasheet conversion timing.
+    Every averaged sample after the first adds one more filter period."""
+    count = 1 << min(int(samples) >> 4, 4)
+    if ac_freq_50hz:
+        first = 0.110 if continuous else 0.185
+        extra = 0.044
+    else:
+        first = 0.090 if continuous else 0.155
+        extra = 0.036
+    return first + extra * (count - 1)
+
+
 class ThermocoupleType:  # pylint: disable=too-few-public-methods
     """An enum-like class representing the different types of thermocouples that the MAX31856 can
     use. The values can be referenced like ``ThermocoupleType.K`` or ``ThermocoupleType.S``
@@ -126,6 +144,7 @@ class MAX31856:
     :param ~adafruit_max31856.ThermocoupleType thermocouple_type: The type of thermocouple.\
       Default is Type K.
     :param ~bool continuous: Continuous measurements vs. Oneshot conversion
+    :param ~digitalio.DigitalInOut drdy: Optional input wired to the DRDY pin.
 
     **Quickstart: Importing and using the MAX31856**
 
@@ -162,9 +181,15 @@ class MAX31856:
                  continuous=False,
                  samples=SampleType.AVG_SEL_1SAMP,
                  ac_freq_50hz=False,
+                 drdy=None,
                  ):
-        self._device = SPIDevice(spi, cs, baudrate=100000, polarity=0, phase=1)
+        self._device = hardware.SPIDevice(spi, cs, baudrate=100000, polarity=0, phase=1)
         self._continuous = continuous
+        self._drdy = drdy
+        self.conversion_time = conversion_time(samples, ac_freq_50hz, continuous)
+        # reused by every transfer so reading does not allocate
+        self._buffer = bytearray(4)
+        self._burst = bytearray(_MAX31856_SR_REG - _MAX31856_CJTH_REG + 1)
 
         # assert on any fault
         self._write_u8(_MAX31856_MASK_REG, 0x0)
@@ -309,7 +334,11 @@ class MAX31856:
         ===================   =================================
 
         """
-        faults = self._read_register(_MAX31856_SR_REG, 1)[0]
+        return self.decode_faults(self._read_register(_MAX31856_SR_REG, 1)[0])
+
+    @staticmethod
+    def decode_faults(faults):
+        """The :attr:`fault` dictionary for a raw fault status register value"""
         return {
             "raw": faults,
             "cj_range": bool(faults & _MAX31856_FAULT_CJRANGE),
@@ -322,8 +351,57 @@ class MAX31856:
             "open_tc": bool(faults & _MAX31856_FAULT_OPEN),
         }
 
+    @property
+    def data_ready(self):
+        """True once a new conversion can be read. Without a DRDY input this
+        can not be known and is always True. DRDY is active low and goes back
+        high when the result registers are read."""
+        if self._drdy is None:
+            return True
+        return not self._drdy.value
+
+    @property
+    def has_drdy(self):
+        """True when a DRDY input was given, so :attr:`data_ready` tells (read-only)"""
+        return self._drdy is not None
+
+    @property
+    def continuous(self):
+        """True in automatic conversion mode, False in one-shot mode (read-only)"""
+        return self._continuous
+
+    def read_all(self, convert=True):
+        """Thermocouple temperature, cold junction temperature and the raw fault
+        status register as a ``(temperature, reference_temperature, faults)``
+        tuple, read in a single auto-incrementing burst from CJTH to SR.
+        In one-shot mode a conversion is run first unless ``convert`` is False,
+        e.g. because :meth:`start_conversion` was called and has had time to finish."""
+        if convert and not self._continuous:
+            self._perform_one_shot_measurement()
+
+        burst = self._burst
+        with self._device as device:
+            self._buffer[0] = _MAX31856_CJTH_REG
+            device.write(self._buffer, end=1)
+            device.readinto(burst)
+
+        # CJTH, CJTL: signed, 1/256 degree
+        cold_junction = (burst[0] << 8) | burst[1]
+        if cold_junction & 0x8000:
+            cold_junction -= 0x10000
+        # LTCBH, LTCBM, LTCBL: signed, 1/4096 degree
+        raw_temp = (burst[2] << 16) | (burst[3] << 8) | burst[4]
+        if raw_temp & 0x800000:
+            raw_temp -= 0x1000000
+        return (raw_temp / 4096.0, cold_junction / 256.0, burst[5])
+
     def _perform_one_shot_measurement(self):
+        self.start_conversion()
+        sleep(self.conversion_time)
 
+    def start_conversion(self):
+        """Start a one-shot conversion and return without waiting for it. The result
+        can be read :attr:`conversion_time` seconds later."""
         self._write_u8(_MAX31856_CJTO_REG, 0x0)
         # read the current value of the first config register
         conf_reg_0 = self._read_register(_MAX31856_CR0_REG, 1)[0]
@@ -336,10 +414,8 @@ class MAX31856:
         # write it back with the new values, prompting the sensor to perform a measurement
         self._write_u8(_MAX31856_CR0_REG, conf_reg_0)
 
-        sleep(0.250)
-
     def _read_register(self, address, length):
-        _buffer = bytearray(4)
+        _buffer = self._buffer
         # pylint: disable=no-member
         # Read a 16-bit BE unsigned value from the specified 8-bit address.
         with self._device as device:
@@ -349,7 +425,7 @@ class MAX31856:
         return _buffer[:length]
 
     def _write_u8(self, address, val):
-        _buffer = bytearray(4)
+        _buffer = self._buffer
         # Write an 8-bit unsigned value to the specified 8-bit address.
         with self._device as device:
             _buffer[0] = (address | 0x80) & 0xFF
@@ -0,0 +1,128 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds, from a fast pid step to a slow spi frame or sd card sync
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (n, v) for n, v in zip(names, values))
+
+
+class Histogram():
+    '''cumulative latency histogram, one series per label value'''
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # per bucket counts, +Inf, sum
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list:
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s histogram' % (self.name,)]
+        with self.lock:
+            series = [(k, list(v[0]), v[1]) for k, v in sorted(self.series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (
+                    self.name,
+                    _labels(self.labelnames + ('le',), labels + (bound,)),
+                    cumulative))
+            lines.append('%s_sum%s %.6f' % (
+                self.name, _labels(self.labelnames, labels), total))
+            lines.append('%s_count%s %d' % (
+                self.name, _labels(self.labelnames, labels), cumulative))
+        return lines
+
+
+class Counter():
+    '''monotonic count, incremented with inc() or read from fn when given.
+       fn returns a number, or a {label value: number} dict for labelnames'''
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s counter' % (self.name,)]
+        if self.fn is not None:
+            value = self.fn()
+            if isinstance(value, dict):
+                values = {(k,): v for k, v in value.items()}
+            else:
+                values = {(): value}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            lines.append('%s%s %s' % (
+                self.name, _labels(self.labelnames, labels), value))
+        return lines
+
+
+class Registry():
+    '''every metric of the controller, rendered in the prometheus text
+       exposition format by render()'''
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        # re-registering replaces, e.g. a new oven in the same process
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self.metrics):
+            lines.extend(self.metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.register(Histogram(
+    'kiln_stage_seconds', 'Time spent in each stage of the control loop',
+    labelnames=('stage',)))
+sensor_faults = REGISTRY.register(Counter(
+    'kiln_sensor_faults_total', 'Thermocouple readings with a fault bit set'))
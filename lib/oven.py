@@ -1,35 +1,43 @@
 import os
+import abc
 from lib.max31856 import MAX31856, SampleType
-from lib.safetyswitch import SafetySwitch
+from lib.safetyswitch import SafetySwitch, SimulatedSafetySwitch
+from lib.clock import Clock, LoopTimer
+from lib.runlog import RunlogWriter, BinaryRunlogWriter
+from lib.enums import SegmentType
 from lib.tempSensor import TempSensorSimulated
+from lib.sensorScheduler import SensorScheduler
+from lib.estimator import KalmanEstimator
+from lib.heaterScheduler import HeaterScheduler
+from lib.metrics import stage_seconds
 from lib.zone import Zone, SimulatedZone
-import board
-import csv
-import digitalio
+from lib import hardware
 import threading
 import time
 import datetime
 import logging
 import json
+import bisect
 
 log = logging.getLogger(__name__)
-event = threading.Event()
 script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 runlog_path = os.path.join(script_dir, "storage", "runlog")
 
 
-class Oven(threading.Thread):
+class Oven(threading.Thread, abc.ABC):
     '''parent oven class. this has all the common code
        for either a real or simulated oven'''
 
-    def __init__(self, config):
+    def __init__(self, config, clock: Clock = None):
         self._tuning = False
         self.runID = None
         threading.Thread.__init__(self)
         self.daemon = True
+        self.clock = clock if clock is not None else Clock()
         self.temperature = 0
         self.faulted_count = 0
         self.time_step = config.sensor_time_wait
+        self.loop_timer = LoopTimer(self.time_step, clock=self.clock)
         self.kiln_must_catch_up = config.kiln_must_catch_up
         self.kiln_must_catch_up_max_error = config.kiln_must_catch_up_max_error
         self.emergency_shutoff_temp = config.emergency_shutoff_temp
@@ -40,45 +48,34 @@ class Oven(threading.Thread):
             'stop_integral_windup': config.stop_integral_windup
         }
         self.zone_max_lag = config.zone_max_lag
+        self.low_power_sampling = config.sensor_low_power
+        self.pid_use_estimator = config.pid_use_estimator
+        self.estimator_params = {
+            'process_noise': config.estimator_process_noise,
+            'measurement_noise': config.estimator_measurement_noise,
+            'duty_rate': config.estimator_duty_rate,
+        }
+        self.estimate = 0
+        self.heat_rate = 0
+        self.runlog = RunlogWriter(
+            runlog_path,
+            flush_interval=config.runlog_flush_interval,
+            flush_rows=config.runlog_flush_rows,
+            clock=self.clock
+        )
+        self.binary_runlog = None
+        if config.runlog_binary:
+            self.binary_runlog = BinaryRunlogWriter(
+                runlog_path,
+                flush_interval=config.runlog_flush_interval,
+                flush_rows=config.runlog_flush_rows,
+                clock=self.clock
+            )
         self.zones = []
-        if config.simulate:
-            for zc in config.zones:
-                self.zones.append(
-                    SimulatedZone(
-                        TempSensorSimulated(config.sensor_time_wait),
-                        config.sensor_time_wait,
-                    )
-                )
-        else:
-            spi = board.SPI()
-            sensors = []
-            for chip in config.thermocouples['chips']:
-                cs = digitalio.DigitalInOut(chip.cs_pin)
-                cs.direction = digitalio.Direction.OUTPUT
-                cs.value = True
-                sensor = MAX31856(
-                    spi, cs, chip.tc_type, continuous=True, ac_freq_50hz=config.thermocouples['ac_freq_50hz'],
-                    samples=SampleType.AVG_SEL_4SAMP
-                )
-                sensors.append(sensor)
-            for sensor in sensors:
-                # hardcoded safety limits in celsius
-                sensor.temperature_thresholds = (-20.0, 1250)
-                sensor.reference_temperature_thresholds = (-20.0, 60.0)
-            for zc in config.zones:
-                zone = Zone(
-                    name=zc.name,
-                    gpio_heat=zc.gpio_heat,
-                    gpio_active_high=zc.gpio_active_high,
-                    thermocouple=sensors[zc.thermocouple],
-                    sensor_time_wait=config.sensor_time_wait,
-                    temp_scale=config.temp_scale,
-                    temperature_average_samples=config.temperature_average_samples
-                )
-                zone.start()
-                self.zones.append(zone)
-            self.safety_switch = SafetySwitch(
-                config.safety_switch, config.safety_switch_active_value)
+        self.heater_scheduler = None
+        self.setup_hardware(config)
+        self.estimators = [KalmanEstimator(**self.estimator_params)
+                           for zone in self.zones]
         self.hooks = Hooks(config.hook_run_profile, config.hook_reset)
         self.reset()
 
@@ -87,14 +84,26 @@ class Oven(threading.Thread):
         self.state = "IDLE"
         self.profile = None
         self.runID = None
+        # flush whatever the last run still has buffered
+        self.runlog.close()
+        if self.binary_runlog is not None:
+            self.binary_runlog.close()
         self.start_time = 0
         self.runtime = 0
         self.totaltime = 0
         self.target = 0
+        self.profile_target = None
+        self.zone_state = Zone.snapshot()
+        self.loop_timer.reset()
         self.faulted_count = 0
         for zone in self.zones:
             zone.reset()
-        self.pid = PID(**self.initial_pid_params)
+        if self.heater_scheduler is not None:
+            # off now, not at the next edge of the heater period
+            self.heater_scheduler.cancel()
+        for estimator in self.estimators:
+            estimator.reset()
+        self.pid = PID(clock=self.clock, **self.initial_pid_params)
         self.safety_switch.off()
         if self.hooks.reset:
             os.system(self.hooks.reset)
@@ -115,7 +124,7 @@ class Oven(threading.Thread):
         self.profile = profile
         self.totaltime = profile.get_duration()
         self.state = "RUNNING"
-        self.start_time = datetime.datetime.now()
+        self.start_time = self.clock.now()
         self.startat = startat * 60
         self.safety_switch.on()
         self.runID = "%s-%s" % (
@@ -134,20 +143,25 @@ class Oven(threading.Thread):
         '''shift the whole schedule forward in time by one time_step
         to wait for the kiln to catch up'''
         if self.kiln_must_catch_up == True:
-            temp = Zone.getAvgTemp()
+            temp = self.zone_state.avg
+            # runtime has not moved since update_target_temp looked it up
+            if self.profile_target is not None:
+                ramping_up = self.profile_target.kind == SegmentType.Ramp
+            else:
+                ramping_up = self.profile.isRampingUp(self.runtime)
             # kiln too cold, wait for it to heat up
-            if self.target - temp > self.kiln_must_catch_up_max_error and self.profile.isRampingUp(self.runtime):
+            if self.target - temp > self.kiln_must_catch_up_max_error and ramping_up:
                 log.info("kiln must catch up, too cold, shifting schedule")
                 self.start_time = self.start_time + \
                     datetime.timedelta(seconds=self.time_step)
             # kiln too hot, wait for it to cool down
-            if temp - self.target > self.kiln_must_catch_up_max_error and not self.profile.isRampingUp(self.runtime):
+            if temp - self.target > self.kiln_must_catch_up_max_error and not ramping_up:
                 log.info("kiln must catch up, too hot, shifting schedule")
                 self.start_time = self.start_time + \
                     datetime.timedelta(seconds=self.time_step)
 
     def update_runtime(self):
-        runtime_delta = datetime.datetime.now() - self.start_time
+        runtime_delta = self.clock.now() - self.start_time
         if runtime_delta.total_seconds() < 0:
             runtime_delta = datetime.timedelta(0)
 
@@ -157,10 +171,37 @@ class Oven(threading.Thread):
             self.runtime = runtime_delta.total_seconds()
 
     def update_target_temp(self):
-        self.target = self.profile.get_target_temperature(self.runtime)
+        self.profile_target = self.profile.lookup(self.runtime)
+        if self.profile_target is None:
+            self.target = 0
+        else:
+            self.target = self.profile_target.target
 
     def update_temperature(self):
-        self.temperature = Zone.getAvgTemp()
+        zone_state = Zone.snapshot()
+        self.temperature = zone_state.avg
+        self.update_estimates(zone_state)
+
+    def update_estimates(self, zone_state):
+        '''run every zone's reading through its KalmanEstimator. estimate
+           and heat_rate are the averages over the heated zones. a zone
+           without a reading yet is left out, its estimator is seeded by
+           the first one'''
+        now = self.clock.monotonic()
+        temps = []
+        rates = []
+        for zone, estimator in zip(self.zones, self.estimators):
+            record = zone_state[zone.zone_index]
+            if not record.sampled:
+                continue
+            temp, rate = estimator.update(
+                record.temperature, zone.heat / zone.time_step, now)
+            if record.heated:
+                temps.append(temp)
+                rates.append(rate)
+        if temps:
+            self.estimate = sum(temps) / len(temps)
+            self.heat_rate = sum(rates) / len(rates)
 
     def reset_if_emergency(self):
         zone: Zone
@@ -190,17 +231,30 @@ class Oven(threading.Thread):
             self.reset()
 
     def get_state(self):
+        zone_state = Zone.snapshot()
         state = {
             'runtime': self.runtime,
-            'temperature': Zone.getAvgTemp(),
+            'temperature': zone_state.avg,
             'target': round(self.target, 2),
             'state': self.state,
             'totaltime': self.totaltime,
             'profile': self.profile.name if self.profile else None,
-            'zones': Zone.stats.copy()
+            'runlog_at_risk': self.runlog.at_risk(),
+            'heat_rate': round(self.heat_rate, 4),
+            'loop': self.loop_timer.stats(),
+            'zones': zone_state.as_dicts()
         }
+        for zone, oven_zone, estimator in zip(state['zones'], self.zones,
+                                              self.estimators):
+            zone['Rate'] = round(estimator.rate, 4)
+            zone['Delivered_pct'] = round(
+                oven_zone.delivered / oven_zone.time_step * 100, 1)
         return state
 
+    @abc.abstractmethod
+    def setup_hardware(self, config):
+        '''create the zones and the safety switch'''
+
     def run(self):
         while True:
             self.update_temperature()
@@ -208,32 +262,50 @@ class Oven(threading.Thread):
                 self.reset_if_emergency()
                 continue
             if self.state == "IDLE":
-                event.wait(1)
+                self.clock.wait(1)
                 continue
             if self.state == "RUNNING":
-                self.catch_up()
-                self.update_runtime()
-                self.update_target_temp()
-                self.heat_then_cool()
-                self.reset_if_emergency()
-                self.reset_if_schedule_ended()
+                self.tick()
+                # sleep until the next deadline, not a whole time_step
+                self.loop_timer.wait()
+
+    def tick(self):
+        '''one control step of a running schedule'''
+        with stage_seconds.time('tick'):
+            # every decision of this step sees the zones at the same instant
+            self.zone_state = Zone.snapshot()
+            self.catch_up()
+            self.update_runtime()
+            self.update_target_temp()
+            self.heat_then_cool()
+            self.reset_if_emergency()
+            self.reset_if_schedule_ended()
+            with stage_seconds.time('runlog'):
                 self.write_to_runlog()
-                event.wait(self.time_step)
 
     def heat_then_cool(self):
-        pid = self.pid.compute(self.target,
-                               Zone.getAvgTemp())
+        with stage_seconds.time('pid'):
+            if self.pid_use_estimator:
+                pid = self.pid.compute(self.target, self.estimate,
+                                       rate=self.heat_rate)
+            else:
+                pid = self.pid.compute(self.target,
+                                       self.zone_state.avg)
         heat_on = float(self.time_step * pid)
 
         zone: Zone
-        for zone in self.zones:
-            zone_pid = clip(self.calc_zone_pid(pid, zone), 0, 1)
-            zone_heat_on = float(self.time_step * zone_pid)
-            zone.heat_for(zone_heat_on)
-        self.log_heating(pid, heat_on, self.time_step - heat_on)
+        with stage_seconds.time('zone_pid'):
+            for zone in self.zones:
+                zone_pid = clip(self.calc_zone_pid(pid, zone), 0, 1)
+                zone_heat_on = float(self.time_step * zone_pid)
+                zone.heat_for(zone_heat_on)
+        with stage_seconds.time('log_heating'):
+            self.log_heating(pid, heat_on, self.time_step - heat_on)
 
     def calc_zone_pid(self, pid: float, zone: Zone) -> float:
-        zone_error = zone.getTemperature() - self.target
+        zone_temp = self.zone_state[zone.zone_index].temperature
+        temp_range = self.zone_state.range
+        zone_error = zone_temp - self.target
         if pid <= 0:
             if zone_error < 0 - self.zone_max_lag:
                 # zone is lagging and others are off, force power on
@@ -243,10 +315,10 @@ class Oven(threading.Thread):
         if zone_error > self.zone_max_lag:
             # above the setpoint, decrease power on time
             return pid * 0.8
-        if zone.getTemperature() > self.target and zone.getTempRange() > self.zone_max_lag * 2:
+        if zone_temp > self.target and temp_range > self.zone_max_lag * 2:
             # above the setpoint and another zone is lagging, decrease power on time
             return pid * 0.9
-        if zone.getTemperature() > self.temperature and zone.getTempRange() > self.zone_max_lag:
+        if zone_temp > self.temperature and temp_range > self.zone_max_lag:
             # above the average and another zone is lagging, decrease power on time
             return pid * 0.95
         if zone_error < 0 - self.zone_max_lag:
@@ -259,7 +331,7 @@ class Oven(threading.Thread):
         time_left = self.totaltime - self.runtime
 
         log.info("BASE: temp=%.2f, target=%.2f, pid=%.3f, heat_on=%.2f, heat_off=%.2f, run_time=%d, total_time=%d, time_left=%d" %
-                 (Zone.getAvgTemp(),
+                 (self.zone_state.avg,
                   self.target,
                   pid,
                   heat_on,
@@ -272,33 +344,50 @@ class Oven(threading.Thread):
     def write_to_runlog(self, headers=False):
         if self.runID is None:
             return
-        filename = '%s.csv' % (self.runID,)
-        with open(os.path.join(runlog_path, filename), 'a', newline='') as csvfile:
-            runwriter = csv.writer(csvfile)
-            if headers:
-                header_row = ['Time', 'Target', 'AVG', 'PID']
-
-                for zone in Zone.stats:
-                    header_row.append(zone['Name'])
-                    header_row.append('%s err' % (zone['Name'],))
-                    header_row.append('%s pow' % (zone['Name'],))
-                runwriter.writerow(header_row)
-
-            row_data = [
-                datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                round(self.target, 1),
-                round(self.temperature, 1),
-                round(self.pid.lastValue, 2)
-            ]
-            for zone in Zone.stats:
-                row_data.append(zone['Temp'])
-                row_data.append(zone['Delta'])
-                row_data.append(zone['Heat_pct'])
-            runwriter.writerow(row_data)
+        if headers:
+            header_row = ['Time', 'Target', 'AVG', 'PID']
+
+            for zone in Zone.snapshot().zones:
+                header_row.append(zone.name)
+                header_row.append('%s err' % (zone.name,))
+                header_row.append('%s pow' % (zone.name,))
+            self.runlog.open('%s.csv' % (self.runID,), header_row)
+            if self.binary_runlog is not None:
+                self.binary_runlog.open('%s.bin' % (self.runID,), header_row)
+
+        zone_data = []
+        for zone in Zone.snapshot().zones:
+            zone_data.append(zone.temp)
+            zone_data.append(zone.delta)
+            zone_data.append(zone.heat_pct)
+        now = self.clock.now()
+
+        row_data = [
+            self.runlog.timestamp(now),
+            round(self.target, 1),
+            round(self.temperature, 1),
+            round(self.pid.lastValue, 2)
+        ]
+        self.runlog.write(row_data + zone_data)
+        if self.binary_runlog is not None:
+            self.binary_runlog.write([
+                now.timestamp(),
+                self.target,
+                self.temperature,
+                self.pid.lastValue
+            ] + zone_data)
+
+    def flush_runlog(self):
+        '''sync buffered rows so the runlog on disk is complete'''
+        self.runlog.flush()
+        if self.binary_runlog is not None:
+            self.binary_runlog.flush()
 
     def forceOff(self):
         self.safety_switch.off()
         self._tuning = False
+        if self.heater_scheduler is not None:
+            self.heater_scheduler.cancel()
         for zone in self.zones:
             zone.forceOff()
 
@@ -318,24 +407,31 @@ class Oven(threading.Thread):
 
 class SimulatedOven(Oven):
 
-    def __init__(self, config):
+    def __init__(self, config, clock: Clock = None, autostart: bool = True):
         # call parent init
-        Oven.__init__(self, config)
+        Oven.__init__(self, config, clock)
 
         for zone in self.zones:
             zone.setSimulatedParams(config)
 
         self.reset()
 
-        # start thread
-        self.start()
-        log.info("SimulatedOven started")
-
-    def heat_then_cool(self):
-        super().heat_then_cool()
-        # we don't actually spend time heating & cooling during
-        # a simulation, so sleep.
-        event.wait(self.time_step)
+        # start thread. a simulation driven by a VirtualClock calls
+        # tick() itself instead, see lib/simulator.py
+        if autostart:
+            self.start()
+            log.info("SimulatedOven started")
+
+    def setup_hardware(self, config):
+        for zc in config.zones:
+            self.zones.append(
+                SimulatedZone(
+                    TempSensorSimulated(config.sensor_time_wait),
+                    config.sensor_time_wait,
+                    clock=self.clock,
+                )
+            )
+        self.safety_switch = SimulatedSafetySwitch()
 
     def log_heating(self, pid, heat_on, heat_off):
         super().log_heating(pid, heat_on, heat_off)
@@ -355,67 +451,182 @@ class SimulatedOven(Oven):
 
 class RealOven(Oven):
 
-    def __init__(self, config):
+    def __init__(self, config, clock: Clock = None):
         # call parent init
-        Oven.__init__(self, config)
+        Oven.__init__(self, config, clock)
         self.reset()
 
         # start thread
         self.start()
 
+    def setup_hardware(self, config):
+        if hardware.backend.error is not None:
+            # never drive a real kiln's heaters and contactor as fakes
+            raise RuntimeError(
+                "hardware libraries failed to load (%s). set simulate = True, "
+                "or KILN_HARDWARE=fake to run on fake hardware on purpose" %
+                (hardware.backend.error,))
+        if hardware.backend.name == 'fake':
+            log.warning("running on fake hardware, the kiln is not heated")
+        board = hardware.board
+        digitalio = hardware.digitalio
+        spi = board.SPI()
+        sensors = []
+        for chip in config.thermocouples['chips']:
+            cs = digitalio.DigitalInOut(chip.cs_pin)
+            cs.direction = digitalio.Direction.OUTPUT
+            cs.value = True
+            drdy = None
+            if chip.drdy_pin is not None:
+                drdy = digitalio.DigitalInOut(chip.drdy_pin)
+                drdy.direction = digitalio.Direction.INPUT
+            sensor = MAX31856(
+                spi, cs, chip.tc_type, continuous=not self.low_power_sampling,
+                ac_freq_50hz=config.thermocouples['ac_freq_50hz'],
+                samples=SampleType.AVG_SEL_4SAMP, drdy=drdy
+            )
+            sensors.append(sensor)
+        for sensor in sensors:
+            # hardcoded safety limits in celsius
+            sensor.temperature_thresholds = (-20.0, 1250)
+            sensor.reference_temperature_thresholds = (-20.0, 60.0)
+        # one thread reads every chip per frame, temperature_average_samples
+        # frames per sensor_time_wait, slowed down to the conversion rate
+        self.sensor_scheduler = SensorScheduler(
+            sensors,
+            config.sensor_time_wait / float(config.temperature_average_samples),
+            clock=self.clock)
+        for zc in config.zones:
+            zone = Zone(
+                name=zc.name,
+                gpio_heat=zc.gpio_heat,
+                gpio_active_high=zc.gpio_active_high,
+                thermocouple=sensors[zc.thermocouple],
+                sensor_time_wait=config.sensor_time_wait,
+                temp_scale=config.temp_scale,
+                temperature_average_samples=config.temperature_average_samples,
+                clock=self.clock,
+                sensor_scheduler=self.sensor_scheduler,
+                sample_filter=zc.sample_filter,
+                watts=zc.watts
+            )
+            self.zones.append(zone)
+        self.sensor_scheduler.start()
+        # one thread switches every heater instead of a thread per zone
+        self.heater_scheduler = HeaterScheduler(
+            self.zones, config.sensor_time_wait,
+            resolution=config.heater_resolution,
+            max_load=config.heater_max_load, clock=self.clock)
+        self.heater_scheduler.start()
+        self.safety_switch = SafetySwitch(
+            config.safety_switch, config.safety_switch_active_value)
+
+
+class Segment():
+    '''one straight line of a profile between two points'''
+    __slots__ = ('index', 'start', 'end', 'start_temp', 'slope', 'kind',
+                 'prev_point', 'next_point')
+
+    def __init__(self, index, prev_point, next_point):
+        self.index = index
+        self.prev_point = prev_point
+        self.next_point = next_point
+        self.start = prev_point[0]
+        self.end = next_point[0]
+        self.start_temp = prev_point[1]
+        self.slope = float(next_point[1] - prev_point[1]) / \
+            float(next_point[0] - prev_point[0])
+        if self.slope > 0:
+            self.kind = SegmentType.Ramp
+        elif self.slope < 0:
+            self.kind = SegmentType.Cool
+        else:
+            self.kind = SegmentType.Hold
+
+
+class ProfileTarget():
+    '''result of Profile.lookup() for a point in time'''
+    __slots__ = ('target', 'slope', 'segment', 'remaining', 'kind')
+
+    def __init__(self, target, slope, segment, remaining, kind):
+        self.target = target
+        self.slope = slope
+        self.segment = segment
+        self.remaining = remaining
+        self.kind = kind
+
 
 class Profile():
     def __init__(self, json_data):
         obj = json.loads(json_data)
         self.name = obj["name"]
         self.data = sorted(obj["data"])
+        self.compile()
+
+    def compile(self):
+        '''index the points once so lookup() can bisect instead of scan'''
+        self.duration = max([t for (t, x) in self.data])
+        self.segments = []
+        for i in range(1, len(self.data)):
+            # points sharing a time are a step, never selected by time
+            if self.data[i][0] > self.data[i-1][0]:
+                self.segments.append(
+                    Segment(len(self.segments), self.data[i-1], self.data[i]))
+        self.starts = [seg.start for seg in self.segments]
 
     def get_duration(self):
-        return max([t for (t, x) in self.data])
+        return self.duration
+
+    def get_segment(self, time):
+        if time > self.duration or not self.segments:
+            return None
+        # time == duration belongs to the last segment
+        i = bisect.bisect_right(self.starts, time) - 1
+        return self.segments[max(i, 0)]
+
+    def lookup(self, time):
+        '''target, slope, segment and time left in that segment, or None
+           once the schedule is over'''
+        seg = self.get_segment(time)
+        if seg is None:
+            return None
+        return ProfileTarget(
+            seg.start_temp + (time - seg.start) * seg.slope,
+            seg.slope,
+            seg.index,
+            seg.end - time,
+            seg.kind,
+        )
 
     def get_surrounding_points(self, time):
-        if time > self.get_duration():
+        seg = self.get_segment(time)
+        if seg is None:
             return (None, None)
-
-        prev_point = None
-        next_point = None
-
-        for i in range(len(self.data)):
-            if time < self.data[i][0]:
-                prev_point = self.data[i-1]
-                next_point = self.data[i]
-                break
-
-        return (prev_point, next_point)
+        return (seg.prev_point, seg.next_point)
 
     def get_target_temperature(self, time):
-        if time > self.get_duration():
+        found = self.lookup(time)
+        if found is None:
             return 0
-
-        (prev_point, next_point) = self.get_surrounding_points(time)
-
-        incl = float(next_point[1] - prev_point[1]) / \
-            float(next_point[0] - prev_point[0])
-        temp = prev_point[1] + (time - prev_point[0]) * incl
-        return temp
+        return found.target
 
     def isRampingUp(self, time):
-        (prev_point, next_point) = self.get_surrounding_points(time)
-        incl = float(next_point[1] - prev_point[1]) / \
-            float(next_point[0] - prev_point[0])
-        return (incl > 0)
+        seg = self.get_segment(time)
+        return seg is not None and seg.kind == SegmentType.Ramp
 
 
 class PID():
 
-    def __init__(self, ki=1, kp=1, kd=1, stop_integral_windup=True):
+    def __init__(self, ki=1, kp=1, kd=1, stop_integral_windup=True, clock: Clock = None):
         self.ki = ki
         self.kp = kp
         self.kd = kd
         self.stop_integral_windup = stop_integral_windup
-        self.lastNow = datetime.datetime.now()
+        self.clock = clock if clock is not None else Clock()
+        self.lastNow = self.clock.now()
         self.iterm = 0
         self.lastErr = 0
+        self.lastSetpoint = None
         self.lastValue = 0
 
     # FIX - this was using a really small window where the PID control
@@ -423,15 +634,25 @@ class PID():
     # settled on -50 to 50 and then divide by 50 at the end. This results
     # in a larger PID control window and much more accurate control...
     # instead of what used to be binary on/off control.
-    def compute(self, setpoint, ispoint):
-        now = datetime.datetime.now()
+    def compute(self, setpoint, ispoint, rate=None):
+        '''rate is the measured heating rate of ispoint per second. when
+           given the derivative uses it instead of differentiating the
+           error, which would amplify the thermocouple noise'''
+        now = self.clock.now()
         timeDelta = (now - self.lastNow).total_seconds()
 
         window_size = 100
 
         error = float(setpoint - ispoint)
 
-        dErr = (error - self.lastErr) / timeDelta
+        if rate is None:
+            dErr = (error - self.lastErr) / timeDelta
+        else:
+            setpoint_rate = 0
+            if self.lastSetpoint is not None:
+                setpoint_rate = (setpoint - self.lastSetpoint) / timeDelta
+            dErr = setpoint_rate - rate
+        self.lastSetpoint = setpoint
         output = self.kp * error + self.iterm + self.kd * dErr
         out4logs = output
         output = sorted([-1 * window_size, output, window_size])[1]
@@ -1,24 +1,29 @@
 import threading
 import logging
 import json
-import time
-import datetime
-from lib.oven import Oven
+import zlib
+from lib.history import lttb, HistoryBuffer
+from lib.broadcast import BroadcastHub
+from lib.statusStream import StatusEncoder
+from lib.metrics import stage_seconds
 log = logging.getLogger(__name__)
-event = threading.Event()
 
 
 class OvenWatcher(threading.Thread):
-    def __init__(self, oven):
+    def __init__(self, oven, broadcast: BroadcastHub = None, autostart: bool = True):
         self.last_profile = None
-        self.last_log = []
+        # runtime, temperature, target, then each zone's temp
+        self.history = None
+        self.history_zones = []
         self.started = None
         self.recording = False
-        self.observers = []
+        self.broadcast = broadcast if broadcast is not None else BroadcastHub()
+        self.encoder = StatusEncoder()
         threading.Thread.__init__(self)
         self.daemon = True
         self.oven = oven
-        self.start()
+        if autostart:
+            self.start()
 
 # FIXME - need to save runs of schedules in near-real-time
 # FIXME - this will enable re-start in case of power outage
@@ -34,29 +39,60 @@ class OvenWatcher(threading.Thread):
 
             # record state for any new clients that join
             if oven_state.get("state") == "RUNNING":
-                self.last_log.append(oven_state)
+                self.record_state(oven_state)
             else:
                 self.recording = False
             self.notify_all(oven_state)
-            event.wait(self.oven.time_step)
+            self.oven.clock.wait(self.oven.time_step)
+
+    def record_state(self, state):
+        if self.history is None:
+            return
+        row = [state['runtime'], state['temperature'], state['target']]
+        for zone in state['zones']:
+            row.append(zone['Temp'])
+        self.history.append(row)
 
     def lastlog_subset(self, maxpts=50):
-        '''send about maxpts from lastlog by skipping unwanted data'''
-        totalpts = len(self.last_log)
-        if (totalpts <= maxpts):
-            return self.last_log
-        every_nth = int(totalpts / (maxpts - 1))
-        return self.last_log[::every_nth]
+        '''send about maxpts from the history, picked to keep the shape
+        of the temperature curve'''
+        if self.history is None:
+            return []
+        rows = self.history.rows()
+        if len(rows) > maxpts:
+            x = [r[0] for r in rows]
+            y = [r[1] for r in rows]
+            rows = [rows[i] for i in lttb(x, y, maxpts)]
+        return [self.state_from_row(r) for r in rows]
+
+    def state_from_row(self, row):
+        '''the parts of Oven.get_state() the web ui graphs'''
+        zones = []
+        for zone, temp in zip(self.history_zones, row[3:]):
+            zones.append({'Name': zone['Name'],
+                          'Heated': zone['Heated'], 'Temp': temp})
+        return {
+            'runtime': row[0],
+            'temperature': row[1],
+            'target': row[2],
+            'state': "RUNNING",
+            'zones': zones,
+        }
 
     def record(self, profile):
         self.last_profile = profile
-        self.last_log = []
-        self.started = datetime.datetime.now()
+        state = self.oven.get_state()
+        self.history_zones = [{'Name': z['Name'], 'Heated': z['Heated']}
+                              for z in state['zones']]
+        self.history = HistoryBuffer(3 + len(self.history_zones))
+        self.started = self.oven.clock.now()
         self.recording = True
         # we just turned on, add first state for nice graph
-        self.last_log.append(self.oven.get_state())
+        self.record_state(state)
 
-    def add_observer(self, observer):
+    def add_observer(self, observer, version=1, deflate=False):
+        '''version 2 observers get delta frames, with deflate the backlog
+        is sent as a zlib compressed binary message'''
         if self.last_profile:
             p = {
                 "name": self.last_profile.name,
@@ -72,26 +108,19 @@ class OvenWatcher(threading.Thread):
             'log': self.lastlog_subset(),
             # 'started': self.started
         }
-        # print(backlog)
         backlog_json = json.dumps(backlog)
-        try:
-            # print(backlog_json)
-            observer.send(backlog_json)
-        except:
-            log.error("Could not send backlog to new observer")
+        if deflate:
+            backlog_json = zlib.compress(backlog_json.encode('utf-8'))
+        return self.broadcast.subscribe(
+            observer, first_frame=backlog_json, version=version)
 
-        self.observers.append(observer)
+    def remove_observer(self, subscriber):
+        subscriber.close()
 
     def notify_all(self, message):
-        message_json = json.dumps(message)
-        log.debug("sending to %d clients: %s" %
-                  (len(self.observers), message_json))
-        for wsock in self.observers:
-            if wsock:
-                try:
-                    wsock.send(message_json)
-                except:
-                    log.error("could not write to socket %s" % wsock)
-                    self.observers.remove(wsock)
-            else:
-                self.observers.remove(wsock)
+        '''encode once and hand off to the broadcast hub'''
+        with stage_seconds.time('notify_all'):
+            frame = self.encoder.encode(message)
+            log.debug("sending to %d clients: %s" %
+                      (len(self.broadcast.subscribers), frame.full))
+            self.broadcast.publish(frame)
@@ -0,0 +1,100 @@
+import os
+import json
+import logging
+import threading
+
+from lib.oven import Profile
+
+log = logging.getLogger(__name__)
+
+
+class CatalogEntry():
+    __slots__ = ('stamp', 'obj', 'json', 'profile')
+
+    def __init__(self, stamp, obj, profile_json):
+        self.stamp = stamp
+        self.obj = obj
+        self.json = profile_json
+        self.profile = None
+
+
+class ProfileCatalog():
+    '''keeps every profile in profile_path parsed and serialized in memory.
+
+       refresh() stats the directory and only re-reads files whose mtime
+       or size changed, the listing sent to browsers is rebuilt only when
+       something did change.'''
+
+    def __init__(self, profile_path):
+        self.profile_path = profile_path
+        self.entries = {}
+        self.by_name = {}
+        self.listing_json = "[]"
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            try:
+                scanned = [e for e in os.scandir(self.profile_path)
+                           if e.name.endswith('.json') and e.is_file()]
+            except OSError:
+                scanned = []
+
+            changed = False
+            seen = set()
+            for dir_entry in scanned:
+                seen.add(dir_entry.name)
+                stat = dir_entry.stat()
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                entry = self.entries.get(dir_entry.name)
+                if entry is not None and entry.stamp == stamp:
+                    continue
+                changed = True
+                self.entries[dir_entry.name] = self.load(dir_entry.path, stamp)
+
+            for filename in list(self.entries.keys()):
+                if filename not in seen:
+                    del self.entries[filename]
+                    changed = True
+
+            if changed:
+                self.rebuild()
+
+    def load(self, path, stamp):
+        try:
+            with open(path, 'r') as f:
+                obj = json.load(f)
+        except (OSError, ValueError) as e:
+            # remember the stamp so a broken file is not re-read every time
+            log.error("Could not read profile %s: %s" % (path, e))
+            return CatalogEntry(stamp, None, None)
+        log.debug("Loaded profile %s" % path)
+        return CatalogEntry(stamp, obj, json.dumps(obj))
+
+    def rebuild(self):
+        entries = [self.entries[f] for f in sorted(self.entries.keys())
+                   if self.entries[f].obj is not None]
+        self.by_name = {entry.obj.get('name'): entry for entry in entries}
+        self.listing_json = "[" + ", ".join(e.json for e in entries) + "]"
+
+    def forget(self, filename):
+        '''drop a file we just wrote or deleted so the next refresh reads it'''
+        with self.lock:
+            if self.entries.pop(filename, None) is not None:
+                self.rebuild()
+
+    def listing(self) -> str:
+        '''json list of all profiles, as sent over the storage websocket'''
+        self.refresh()
+        return self.listing_json
+
+    def find(self, name) -> Profile:
+        '''the named profile ready to run, or None'''
+        self.refresh()
+        entry = self.by_name.get(name)
+        if entry is None:
+            return None
+        if entry.profile is None:
+            entry.profile = Profile(entry.json)
+        return entry.profile
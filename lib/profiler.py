@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+import time
+import datetime
+import logging
+import json
+import tracemalloc
+
+log = logging.getLogger(__name__)
+script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+diagnostics_path = os.path.join(script_dir, "storage", "diagnostics")
+
+
+def _where(filename: str, lineno: int) -> str:
+    if filename.startswith(script_dir + os.sep):
+        filename = os.path.relpath(filename, script_dir)
+    return "%s:%d" % (filename, lineno)
+
+
+class SamplingProfiler(threading.Thread):
+    '''profiles the running controller for a few seconds.
+
+       with cpu set, the stack of every other thread is sampled each
+       interval seconds. a function is counted as self where it was the
+       innermost python frame and as total where it was anywhere on the
+       stack. a sample holds the gil, so the interval is widened whenever
+       sampling would take more than max_overhead of the elapsed time.
+       with memory set, tracemalloc traces allocations for the duration
+       and the sites still holding the most memory at the end are listed.
+
+       the result is written as json to path and kept in result, error
+       is set instead when profiling failed.'''
+
+    def __init__(self, seconds: float, interval: float = 0.01,
+                 max_overhead: float = 0.02, cpu: bool = True,
+                 memory: bool = False, top: int = 20, path: str = diagnostics_path):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.name = "profiler"
+        self.seconds = seconds
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self.filename = os.path.join(
+            path, datetime.datetime.now().strftime("profile-%Y%m%d-%H%M%S.json"))
+        self.samples = 0
+        self.cost = 0.0
+        self.self_counts = {}
+        self.total_counts = {}
+        self.thread_counts = {}
+        self.result = None
+        self.error = None
+
+    def sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            name = names.get(ident, str(ident))
+            self.thread_counts[name] = self.thread_counts.get(name, 0) + 1
+            key = (frame.f_code.co_filename, frame.f_code.co_firstlineno,
+                   frame.f_code.co_name)
+            self.self_counts[key] = self.self_counts.get(key, 0) + 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                # count recursion once
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] = self.total_counts.get(key, 0) + 1
+                frame = frame.f_back
+        self.samples += 1
+
+    def functions(self) -> list:
+        samples = sum(self.thread_counts.values()) or 1
+        ranked = sorted(self.self_counts.items(), key=lambda kv: -kv[1])
+        return [{
+            'function': "%s %s" % (_where(filename, lineno), name),
+            'self': count,
+            'self_pct': round(count / samples * 100, 1),
+            'total': self.total_counts[(filename, lineno, name)],
+            'total_pct': round(self.total_counts[(filename, lineno, name)] / samples * 100, 1),
+        } for (filename, lineno, name), count in ranked[:self.top]]
+
+    def allocations(self, snapshot) -> list:
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        return [{
+            'site': _where(stat.traceback[0].filename, stat.traceback[0].lineno),
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        } for stat in snapshot.statistics('lineno')[:self.top]]
+
+    def profile(self) -> dict:
+        tracing = False
+        if self.memory and not tracemalloc.is_tracing():
+            # one frame per allocation keeps the tracing overhead down
+            tracemalloc.start(1)
+            tracing = True
+        try:
+            start = time.monotonic()
+            end = start + self.seconds
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self.cpu:
+                    began = time.perf_counter()
+                    self.sample()
+                    cost = time.perf_counter() - began
+                    self.cost += cost
+                    self.interval = max(self.interval, cost / self.max_overhead)
+                time.sleep(min(self.interval, remaining))
+            elapsed = time.monotonic() - start
+            snapshot = tracemalloc.take_snapshot() if self.memory else None
+        finally:
+            if tracing:
+                tracemalloc.stop()
+
+        result = {
+            'seconds': round(elapsed, 2),
+            'samples': self.samples,
+            'interval': round(self.interval, 4),
+            'overhead_pct': round(self.cost / elapsed * 100, 2),
+            'threads': self.thread_counts,
+            'functions': self.functions(),
+        }
+        if snapshot is not None:
+            result['allocations'] = self.allocations(snapshot)
+        return result
+
+    def run(self):
+        try:
+            result = self.profile()
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(self.filename, 'w') as f:
+                json.dump(result, f, indent=1)
+            result['file'] = os.path.relpath(self.filename, script_dir)
+            log.info("profile written to %s" % (self.filename,))
+            self.result = result
+        except Exception as e:
+            log.exception("profiling failed")
+            self.error = str(e)
@@ -0,0 +1,188 @@
+import os
+import csv
+import json
+import struct
+import logging
+import datetime
+import threading
+
+from lib.clock import Clock
+
+log = logging.getLogger(__name__)
+
+
+class RunlogWriter():
+    '''keeps the runlog of the current firing open for the whole run.
+
+       rows are buffered and flushed + fsynced to the sd card once
+       flush_rows rows are pending or flush_interval seconds passed since
+       the last flush, whichever comes first. close() always flushes.'''
+
+    def __init__(self, path, flush_interval: float = 30, flush_rows: int = 15,
+                 clock: Clock = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.clock = clock if clock is not None else Clock()
+        self.lock = threading.Lock()
+        self.file = None
+        self.writer = None
+        self.filename = None
+        self.pending_rows = 0
+        self.pending_bytes = 0
+        self.bytes_written = 0
+        self.last_flush = 0
+        self._date = None
+        self._date_str = None
+
+    def open(self, filename, header_row=None):
+        with self.lock:
+            self._close()
+            os.makedirs(self.path, exist_ok=True)
+            self.filename = filename
+            self._open(os.path.join(self.path, filename), header_row)
+            self.last_flush = self.clock.monotonic()
+
+    def _open(self, filepath, header_row):
+        self.file = open(filepath, 'a', newline='', buffering=64 * 1024)
+        self.writer = csv.writer(self.file)
+        if header_row is not None:
+            self._write(header_row)
+
+    def timestamp(self, now) -> str:
+        '''now.strftime('%Y-%m-%d %H:%M:%S') with the date part cached'''
+        date = now.date()
+        if date != self._date:
+            self._date = date
+            self._date_str = date.strftime('%Y-%m-%d')
+        return "%s %02d:%02d:%02d" % (self._date_str, now.hour, now.minute, now.second)
+
+    def write(self, row):
+        with self.lock:
+            if self.file is None:
+                return
+            self._write(row)
+            if (self.pending_rows >= self.flush_rows or
+                    self.clock.monotonic() - self.last_flush >= self.flush_interval):
+                self._flush()
+
+    def _write(self, row):
+        written = self._write_row(row)
+        self.pending_rows += 1
+        self.pending_bytes += written
+        self.bytes_written += written
+
+    def _write_row(self, row) -> int:
+        return self.writer.writerow(row)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.file is None:
+            return
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            log.error("Could not flush runlog %s: %s" % (self.filename, e))
+            return
+        self.pending_rows = 0
+        self.pending_bytes = 0
+        self.last_flush = self.clock.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.file is None:
+            return
+        self._flush()
+        self.file.close()
+        self.file = None
+        self.writer = None
+
+    def at_risk(self) -> dict:
+        '''data that would be lost if power failed right now'''
+        if self.file is None or not self.pending_rows:
+            age = 0
+        else:
+            age = self.clock.monotonic() - self.last_flush
+        return {
+            'rows': self.pending_rows,
+            'bytes': self.pending_bytes,
+            'seconds': round(age, 1),
+        }
+
+
+# binary runlog layout:
+#   magic, uint32 header length, json header, padding to 8 bytes,
+#   then fixed width little endian records: float64 unix time followed
+#   by one float32 per remaining column. see lib/runlogReader.py
+BINARY_MAGIC = b'KILNLOG1'
+BINARY_VERSION = 1
+
+
+def binary_record_format(columns) -> str:
+    return '<d' + 'f' * (len(columns) - 1)
+
+
+class BinaryRunlogWriter(RunlogWriter):
+    '''same columns as the csv runlog in a fixed width binary file.
+       rows are [unix time, target, avg, pid, then temp/err/pow per zone]'''
+
+    def _open(self, filepath, header_row):
+        self.file = open(filepath, 'ab', buffering=64 * 1024)
+        self.writer = None
+        if self.file.tell() == 0:
+            header = {
+                'version': BINARY_VERSION,
+                'columns': header_row,
+                'zones': header_row[4::3],
+            }
+            self._write_header(header)
+        else:
+            # appending to the same run, the header is already there
+            with open(filepath, 'rb') as f:
+                header = read_binary_header(f)[0]
+        self.struct = struct.Struct(binary_record_format(header['columns']))
+
+    def _write_header(self, header):
+        blob = json.dumps(header).encode('utf-8')
+        start = len(BINARY_MAGIC) + 4
+        padding = -(start + len(blob)) % 8
+        blob += b' ' * padding
+        data = BINARY_MAGIC + struct.pack('<I', len(blob)) + blob
+        self.file.write(data)
+        self.pending_bytes += len(data)
+        self.bytes_written += len(data)
+
+    def _write_row(self, row) -> int:
+        return self.file.write(self.struct.pack(*row))
+
+
+def read_binary_header(f):
+    '''returns (header dict, offset of the first record)'''
+    if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("not a binary runlog")
+    (length,) = struct.unpack('<I', f.read(4))
+    header = json.loads(f.read(length).decode('utf-8'))
+    return header, len(BINARY_MAGIC) + 4 + length
+
+
+def csv_to_binary(csv_path, binary_path):
+    '''convert a csv runlog written by Oven.write_to_runlog'''
+    path, filename = os.path.split(binary_path)
+    writer = BinaryRunlogWriter(path or '.', flush_rows=1000)
+    with open(csv_path, 'r', newline='') as f:
+        rows = csv.reader(f)
+        header_row = next(rows)
+        writer.open(filename, header_row)
+        for row in rows:
+            if row == header_row:
+                continue
+            stamp = datetime.datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S')
+            writer.write([stamp.timestamp()] + [float(v) for v in row[1:]])
+    writer.close()
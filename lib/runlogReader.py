@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from lib.runlog import read_binary_header
+
+
+class RunlogReader():
+    '''memory maps a binary runlog written by BinaryRunlogWriter.
+
+       columns come back as numpy views straight onto the file, nothing
+       is parsed or copied until the caller touches the data. a record cut
+       short by a power failure at the end of the file is ignored.'''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.header, offset = read_binary_header(f)
+        self.columns = self.header['columns']
+        self.zones = self.header['zones']
+        self.dtype = np.dtype(
+            [(self.columns[0], '<f8')] + [(c, '<f4') for c in self.columns[1:]])
+        count = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(
+                path, dtype=self.dtype, mode='r', offset=offset, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, column):
+        return self.records[column]
+
+    @property
+    def time(self):
+        '''unix timestamps of every row'''
+        return self.records[self.columns[0]]
+
+    def zone(self, name) -> dict:
+        '''temperature, error from the average and power of one zone'''
+        return {
+            'temp': self.records[name],
+            'err': self.records['%s err' % (name,)],
+            'pow': self.records['%s pow' % (name,)],
+        }
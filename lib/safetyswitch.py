@@ -1,6 +1,6 @@
 
-from microcontroller import Pin
-import digitalio
+from lib import hardware
+from lib.hardware import Pin
 import logging
 
 log = logging.getLogger(__name__)
@@ -15,8 +15,8 @@ class SafetySwitch:
             self._pin = None
             return
         self._active_value = active_value
-        self._pin = digitalio.DigitalInOut(pin)
-        self._pin.direction = digitalio.Direction.OUTPUT
+        self._pin = hardware.digitalio.DigitalInOut(pin)
+        self._pin.direction = hardware.digitalio.Direction.OUTPUT
         self.off()
 
     def on(self):
@@ -26,3 +26,16 @@ class SafetySwitch:
     def off(self):
         if self._pin is not None:
             self._pin.value = not self._active_value
+
+
+class SimulatedSafetySwitch:
+    '''no contactor in a simulation, just remember the state'''
+
+    def __init__(self) -> None:
+        self.value = False
+
+    def on(self):
+        self.value = True
+
+    def off(self):
+        self.value = False
@@ -0,0 +1,175 @@
+import abc
+import bisect
+from array import array
+
+
+class SampleFilter(abc.ABC):
+    '''smooths a stream of thermocouple samples. add() takes one sample and
+       returns the filtered value. rejected counts samples thrown out as
+       outliers.'''
+    rejected = 0
+
+    @abc.abstractmethod
+    def add(self, sample: float) -> float:
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MovingAverage(SampleFilter):
+    '''mean of the last size samples from a ring and a running sum'''
+
+    def __init__(self, size: int):
+        self.size = size
+        self.ring = array('d', bytes(8 * size))
+        self.count = 0
+        self.head = 0
+        self.total = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, sample: float) -> float:
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.total -= self.ring[self.head]
+        self.ring[self.head] = sample
+        self.total += sample
+        self.head = (self.head + 1) % self.size
+        if self.head == 0:
+            # once per lap, so rounding errors can not pile up
+            self.total = sum(self.ring)
+        return self.total / self.count
+
+
+class Ewma(SampleFilter):
+    '''exponentially weighted moving average. alpha defaults to the one
+       with the same center of mass as a size sample moving average'''
+
+    def __init__(self, size: int, alpha: float = None):
+        self.alpha = alpha if alpha is not None else 2.0 / (size + 1)
+        self.value = None
+
+    def __len__(self):
+        return 0 if self.value is None else 1
+
+    def add(self, sample: float) -> float:
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+        return self.value
+
+
+class Median(SampleFilter):
+    '''median of the last size samples, kept in a ring plus a sorted copy.
+       a sample is inserted and the expired one removed by bisection, the
+       window is never sorted again'''
+
+    def __init__(self, size: int):
+        self.size = size
+        self.ring = array('d', bytes(8 * size))
+        self.sorted = []
+        self.head = 0
+
+    def __len__(self):
+        return len(self.sorted)
+
+    def push(self, sample: float):
+        if len(self.sorted) == self.size:
+            del self.sorted[bisect.bisect_left(self.sorted, self.ring[self.head])]
+        self.ring[self.head] = sample
+        bisect.insort(self.sorted, sample)
+        self.head = (self.head + 1) % self.size
+
+    def median(self) -> float:
+        n = len(self.sorted)
+        mid = n // 2
+        if n % 2:
+            return self.sorted[mid]
+        return (self.sorted[mid - 1] + self.sorted[mid]) / 2
+
+    def deviation(self, center: float, k: int) -> float:
+        '''k-th smallest of the distances from center to every sample.
+           the distances below and above center are two sorted runs of
+           the window, so this bisects them instead of sorting'''
+        values = self.sorted
+        split = bisect.bisect_left(values, center)
+        below = split
+        above = len(values) - split
+        # take a from below and k + 1 - a from above, the smallest k + 1
+        lo = max(0, k + 1 - above)
+        hi = min(k + 1, below)
+        while lo < hi:
+            a = (lo + hi) // 2
+            if center - values[split - 1 - a] < values[split + k - a] - center:
+                lo = a + 1
+            else:
+                hi = a
+        b = k + 1 - lo
+        result = 0.0
+        if lo > 0:
+            result = center - values[split - lo]
+        if b > 0:
+            result = max(result, values[split + b - 1] - center)
+        return result
+
+    def add(self, sample: float) -> float:
+        self.push(sample)
+        return self.median()
+
+
+class Hampel(SampleFilter):
+    '''outlier rejector. a sample further than threshold scaled median
+       absolute deviations from the median of the last size samples is
+       replaced by that median before it goes on to the next filter.
+       the raw sample still enters the window, so a real step change is
+       followed once it fills half of it. deviations up to min_spread are
+       never outliers, a steady reading would otherwise have a MAD of 0.'''
+
+    # turns the median absolute deviation into a standard deviation
+    MAD_SCALE = 1.4826
+
+    def __init__(self, size: int, threshold: float = 3.0, min_spread: float = 1.0,
+                 then: SampleFilter = None):
+        self.window = Median(size)
+        self.threshold = threshold
+        self.min_spread = min_spread
+        self.then = then
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.window)
+
+    def add(self, sample: float) -> float:
+        self.window.push(sample)
+        value = sample
+        if len(self.window) >= 3:
+            median = self.window.median()
+            mad = self.window.deviation(
+                median, len(self.window) // 2) * self.MAD_SCALE
+            if abs(sample - median) > max(self.threshold * mad, self.min_spread):
+                self.rejected += 1
+                value = median
+        if self.then is not None:
+            return self.then.add(value)
+        return value
+
+
+FILTERS = ('mean', 'ewma', 'median', 'hampel')
+
+
+def make_filter(name: str, size: int) -> SampleFilter:
+    '''filter for ZoneConfig.sample_filter, None is a moving average'''
+    if name is None or name == 'mean':
+        return MovingAverage(size)
+    if name == 'ewma':
+        return Ewma(size)
+    if name == 'median':
+        return Median(size)
+    if name == 'hampel':
+        return Hampel(size, then=MovingAverage(size))
+    raise ValueError("unknown sample filter %r, use one of %s" %
+                     (name, ", ".join(FILTERS)))
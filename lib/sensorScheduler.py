@@ -0,0 +1,166 @@
+import threading
+import logging
+
+from lib.clock import Clock
+from lib.metrics import stage_seconds
+
+log = logging.getLogger(__name__)
+
+# seconds to start and read one chip in one-shot mode, spi transfers and
+# python overhead on a small pi, added to the conversion time of a frame
+read_margin = 0.005
+
+
+class SensorFrame():
+    '''one pass over every chip. readings[i] is (temperature, cold junction
+       temperature, raw fault register) of chip i, or None if it could not
+       be read. fresh[i] is False when chip i had no new conversion'''
+    __slots__ = ('seq', 'stamp', 'readings', 'fresh', 'duration')
+
+    def __init__(self, seq, stamp, readings, fresh, duration):
+        self.seq = seq
+        self.stamp = stamp
+        self.readings = readings
+        self.fresh = fresh
+        self.duration = duration
+
+
+class SensorScheduler(threading.Thread):
+    '''the only thread that talks to the thermocouple chips.
+
+       every period seconds all chips are read back to back in a fixed
+       order while holding bus_lock once, so the zones get readings taken
+       at the same moment instead of each sensor thread grabbing the spi
+       bus on its own timer. frames start on absolute deadlines and do not
+       drift. listeners attached to a chip get each of its readings.
+
+       the period is rounded to whole conversions of the slowest chip, at
+       least one, so every frame finds a new result. a chip whose DRDY says
+       nothing new, or without DRDY one in automatic mode read again before
+       a full conversion time has passed, is not read and counted as a
+       duplicate. equal temperatures are fine, a kiln at rest gives them.
+
+       chips in one-shot mode all start their conversion together at the
+       top of the frame and are read after a single wait for the slowest,
+       so n chips cost one conversion time instead of n. such a frame
+       takes the conversion time plus the reads, so the period is rounded
+       to that instead and the chips idle between frames.'''
+
+    def __init__(self, chips, period: float, clock: Clock = None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.name = "sensors"
+        self.chips = list(chips)
+        conversion = max((c.conversion_time for c in self.chips), default=0)
+        if any(not c.continuous for c in self.chips):
+            conversion += read_margin * len(self.chips)
+        if conversion > 0:
+            period = max(1, round(period / conversion)) * conversion
+        self.period = period
+        self.clock = clock if clock is not None else Clock()
+        self.bus_lock = threading.Lock()
+        self.listeners = [[] for c in self.chips]
+        self.last = [None for c in self.chips]
+        self.duplicates = [0 for c in self.chips]
+        # when each chip without DRDY has a result that was not read yet,
+        # the first conversion is only done a conversion time from now
+        now = self.clock.monotonic()
+        self.due = [now + c.conversion_time for c in self.chips]
+        self.one_shot = [c for c in self.chips if not c.continuous]
+        self.started = set()
+        self.conversion_time = max(
+            (c.conversion_time for c in self.one_shot), default=0)
+        self.frame = None
+        self.seq = 0
+        self.overruns = 0
+
+    def attach(self, chip, listener):
+        '''listener.add_sample(temperature, reference, faults, stamp) is
+           called with every reading of chip, from this thread'''
+        self.listeners[self.chips.index(chip)].append(listener)
+
+    def read_frame(self) -> SensorFrame:
+        readings = []
+        fresh = []
+        start = self.clock.monotonic()
+        if self.one_shot:
+            self.start_conversions()
+        with self.bus_lock, stage_seconds.time('sensor_read'):
+            for i, chip in enumerate(self.chips):
+                if not self.is_ready(i, chip):
+                    readings.append(self.last[i])
+                    fresh.append(False)
+                    continue
+                try:
+                    reading = chip.read_all(convert=False)
+                except Exception as e:
+                    log.error("could not read thermocouple chip: %s" % (e,))
+                    readings.append(None)
+                    fresh.append(False)
+                    continue
+                self.due[i] = self.clock.monotonic() + chip.conversion_time
+                self.last[i] = reading
+                readings.append(reading)
+                fresh.append(True)
+        stamp = self.clock.time()
+        self.seq += 1
+        return SensorFrame(self.seq, stamp, readings, fresh,
+                           self.clock.monotonic() - start)
+
+    def is_ready(self, i, chip) -> bool:
+        '''whether chip i has a conversion that was not read yet'''
+        if not chip.continuous:
+            # a chip whose conversion did not start still holds the old one
+            return chip in self.started
+        if chip.has_drdy:
+            ready = chip.data_ready
+        else:
+            # frames are whole conversions apart, the slack is for a frame
+            # that woke a little late followed by one on time
+            ready = self.clock.monotonic() >= \
+                self.due[i] - chip.conversion_time * 0.1
+        if not ready:
+            self.duplicates[i] += 1
+        return ready
+
+    def start_conversions(self):
+        self.started.clear()
+        with self.bus_lock:
+            for chip in self.one_shot:
+                try:
+                    chip.start_conversion()
+                    self.started.add(chip)
+                except Exception as e:
+                    log.error("could not start a conversion: %s" % (e,))
+        # the bus is free while the chips convert
+        self.clock.wait(self.conversion_time)
+
+    def stats(self) -> dict:
+        return {
+            'frames': self.seq,
+            'overruns': self.overruns,
+            'duplicates': list(self.duplicates),
+        }
+
+    def publish(self, frame: SensorFrame):
+        self.frame = frame
+        for reading, fresh, listeners in zip(frame.readings, frame.fresh,
+                                             self.listeners):
+            if not fresh:
+                continue
+            for listener in listeners:
+                listener.add_sample(
+                    reading[0], reading[1], reading[2], frame.stamp)
+
+    def run(self):
+        deadline = self.clock.monotonic()
+        while True:
+            self.publish(self.read_frame())
+            deadline += self.period
+            delay = deadline - self.clock.monotonic()
+            if delay < 0:
+                # fell behind, start the next frame now and realign
+                self.overruns += 1
+                deadline = self.clock.monotonic()
+                delay = 0
+            self.clock.wait(delay)
@@ -0,0 +1,39 @@
+import logging
+
+from lib.clock import VirtualClock
+from lib.oven import SimulatedOven, Profile
+from lib.zone import Zone
+
+log = logging.getLogger(__name__)
+
+
+def run_simulation(config, profile: Profile, speedup: float = None, startat: int = 0,
+                   seed=None, max_runtime: float = None) -> SimulatedOven:
+    '''run a whole profile against the simulated oven on a VirtualClock.
+
+       the oven is stepped from this thread instead of its own, so the
+       firing takes as long as the cpu needs (or runtime / speedup) and
+       the runlog matches what a real-time simulation would write.
+       max_runtime (seconds of kiln time) stops a schedule that can never
+       catch up. returns the oven so callers can inspect the final state.'''
+    clock = VirtualClock(speedup=speedup)
+    Zone.table.clear()
+    oven = SimulatedOven(config, clock=clock, autostart=False)
+    for zone in oven.zones:
+        if seed is not None:
+            zone.random.seed(seed + zone.zone_index)
+
+    # the oven thread has read the zones before a run starts, so the
+    # first runlog row has a temperature
+    oven.update_temperature()
+    oven.run_profile(profile, startat=startat)
+    while oven.state == "RUNNING":
+        # the oven thread picks up a new run on its next wakeup
+        oven.loop_timer.wait()
+        oven.update_temperature()
+        oven.tick()
+        if max_runtime is not None and clock.monotonic() > max_runtime:
+            log.error("simulation exceeded %ds of kiln time, stopping" %
+                      (max_runtime,))
+            oven.abort_run()
+    return oven
@@ -0,0 +1,67 @@
+import json
+
+
+def flatten(state, prefix=None, out=None) -> dict:
+    '''{'zones': [{'Temp': 1}]} -> {'zones.0.Temp': 1}'''
+    if out is None:
+        out = {}
+    if isinstance(state, dict):
+        items = state.items()
+    elif isinstance(state, list):
+        items = enumerate(state)
+    else:
+        out[prefix] = state
+        return out
+    if not state and prefix is not None:
+        # keep empty containers so the structure is part of the key set
+        out[prefix] = state
+        return out
+    for key, value in items:
+        path = str(key) if prefix is None else "%s.%s" % (prefix, key)
+        flatten(value, path, out)
+    return out
+
+
+class StatusFrame():
+    '''one status update, encoded once for every protocol version.
+
+       full is the plain json state old clients get. delta only holds the
+       fields that changed since the previous frame, or is None when a
+       client has to be sent the keyframe instead.'''
+    __slots__ = ('seq', 'full', 'delta', '_key')
+
+    def __init__(self, seq, full, delta):
+        self.seq = seq
+        self.full = full
+        self.delta = delta
+        self._key = None
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            self._key = '{"type": "key", "seq": %d, "state": %s}' % (
+                self.seq, self.full)
+        return self._key
+
+
+class StatusEncoder():
+    '''turns successive Oven.get_state() dicts into StatusFrames.
+       a keyframe is forced every keyframe_interval frames and whenever
+       the shape of the state changes (e.g. a key appears or a list grows)'''
+
+    def __init__(self, keyframe_interval=60):
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.last = None
+
+    def encode(self, state) -> StatusFrame:
+        self.seq += 1
+        flat = flatten(state)
+        delta = None
+        if (self.last is not None and self.seq % self.keyframe_interval and
+                flat.keys() == self.last.keys()):
+            changed = {k: v for k, v in flat.items() if self.last[k] != v}
+            delta = json.dumps(
+                {"type": "delta", "seq": self.seq, "set": changed})
+        self.last = flat
+        return StatusFrame(self.seq, json.dumps(state), delta)
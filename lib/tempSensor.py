@@ -1,6 +1,9 @@
 from lib.max31856 import MAX31856
 from lib.zoneConfig import ZoneConfig
 from lib.enums import BoardModel
+from lib.sensorScheduler import SensorScheduler
+from lib.sampleFilters import make_filter
+from lib.metrics import sensor_faults
 import threading
 import time
 import logging
@@ -10,14 +13,25 @@ event = threading.Event()
 
 
 class TempSensor(threading.Thread):
-    def __init__(self, sensor_time_wait: int):
+    def __init__(self, sensor_time_wait: int, start: bool = True):
         threading.Thread.__init__(self)
         self.daemon = True
         self.temperature = 0
         self.bad_percent = 0
         self.time_step = sensor_time_wait
         self.faulted = False
-        self.start()
+        if start:
+            self.start()
+
+    @property
+    def rejected(self) -> int:
+        '''samples thrown out as outliers'''
+        return 0
+
+    @property
+    def has_reading(self) -> bool:
+        '''whether temperature comes from a sample yet'''
+        return True
 
 
 class TempSensorSimulated(TempSensor):
@@ -28,8 +42,11 @@ class TempSensorSimulated(TempSensor):
 
 
 class TempSensorReal(TempSensor):
-    '''real temperature sensor thread that takes N measurements
-       during the time_step'''
+    '''real temperature sensor that takes N measurements during the
+       time_step. with a SensorScheduler the scheduler hands it the
+       samples, otherwise it polls the chip from its own thread.
+       sample_filter names the filter from lib/sampleFilters.py that
+       smooths the samples, by default a moving average'''
 
     def __init__(
             self,
@@ -38,6 +55,8 @@ class TempSensorReal(TempSensor):
             temp_scale: str,
             temperature_average_samples: int = 10,
             offset: float = 0.0,
+            scheduler: SensorScheduler = None,
+            sample_filter: str = None,
     ):
         self.temp_scale = temp_scale
         self.temperature_average_samples = temperature_average_samples
@@ -48,43 +67,60 @@ class TempSensorReal(TempSensor):
         self.bad_stamp = 0
         self.thermocouple = thermocouple
         self.offset = offset
-        TempSensor.__init__(self, sensor_time_wait)
+        self.filter = make_filter(sample_filter, temperature_average_samples)
+        self.stamp = 0
+        self.reference_temperature = 0
+        TempSensor.__init__(self, sensor_time_wait, start=scheduler is None)
+        if scheduler is not None:
+            scheduler.attach(thermocouple, self)
+
+    @property
+    def rejected(self) -> int:
+        return self.filter.rejected
+
+    @property
+    def has_reading(self) -> bool:
+        return len(self.filter) > 0
+
+    @property
+    def fault(self) -> dict:
+        return MAX31856.decode_faults(self.faulted)
 
     def convert_to_scale(self, value):
         if self.temp_scale.lower() == 'f':
             return (value * 9/5) + 32
         return value
 
+    def add_sample(self, temp, reference, faults, stamp):
+        '''filter over config.temperature_average_samples samples'''
+        # reset error counter if time is up
+        if (stamp - self.bad_stamp) > (self.time_step * 2):
+            if self.bad_count + self.ok_count:
+                self.bad_percent = (
+                    self.bad_count / (self.bad_count + self.ok_count)) * 100
+            else:
+                self.bad_percent = 0
+            self.bad_count = 0
+            self.ok_count = 0
+            self.bad_stamp = stamp
+
+        self.stamp = stamp
+        self.reference_temperature = reference
+        self.faulted = faults
+
+        if not self.faulted:
+            self.temperature = self.convert_to_scale(
+                self.filter.add(temp)) + self.offset
+            self.ok_count += 1
+        else:
+            log.error("Problem reading temp. Faults: %s" %
+                      (MAX31856.decode_faults(faults),))
+            self.bad_count += 1
+            sensor_faults.inc()
+        log.debug("Logged temp: %0.1f" % (self.temperature,))
+
     def run(self):
-        '''use a moving average of config.temperature_average_samples'''
-        temps = []
         while True:
-            # reset error counter if time is up
-            if (time.time() - self.bad_stamp) > (self.time_step * 2):
-                if self.bad_count + self.ok_count:
-                    self.bad_percent = (
-                        self.bad_count / (self.bad_count + self.ok_count)) * 100
-                else:
-                    self.bad_percent = 0
-                self.bad_count = 0
-                self.ok_count = 0
-                self.bad_stamp = time.time()
-
-            temp = self.thermocouple.temperature
-            self.faulted = self.thermocouple.fault['raw']
-
-            if not self.faulted:
-                temps.append(temp)
-                if len(temps) > self.temperature_average_samples:
-                    del temps[0]
-                self.ok_count += 1
-            else:
-                log.error("Problem reading temp. Faults: %s" %
-                          (self.thermocouple.fault,))
-                self.bad_count += 1
-
-            if len(temps):
-                self.temperature = self.convert_to_scale(
-                    sum(temps) / len(temps)) + self.offset
-            log.debug("Logged temp: %0.1f" % (self.temperature,))
+            temp, reference, faults = self.thermocouple.read_all()
+            self.add_sample(temp, reference, faults, time.time())
             event.wait(self.sleeptime)
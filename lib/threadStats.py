@@ -0,0 +1,88 @@
+import threading
+import time
+import logging
+
+from lib.clock import Clock
+
+log = logging.getLogger(__name__)
+
+
+def thread_cpu_time(thread) -> float:
+    '''cpu seconds used by another thread, None where the os can not tell'''
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+def thread_wakeups(thread) -> int:
+    '''times the thread went to sleep and was woken up again, from the
+       voluntary context switches linux counts. None elsewhere'''
+    try:
+        with open('/proc/self/task/%d/status' % (thread.native_id,)) as f:
+            for line in f:
+                if line.startswith('voluntary_ctxt_switches:'):
+                    return int(line.split()[1])
+    except (AttributeError, OSError, TypeError, ValueError):
+        pass
+    return None
+
+
+class ThreadMonitor(threading.Thread):
+    '''samples the cpu usage and wakeups of the registered threads every
+       interval seconds, so a thread that burns the pi's cpu stands out.
+       stats() has per thread cpu percent (100 is one core) and wakeups
+       per second over the last interval and the cpu seconds in total.'''
+
+    def __init__(self, interval: float = 10, clock: Clock = None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.name = "threadmonitor"
+        self.interval = interval
+        self.clock = clock if clock is not None else Clock()
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.last = {}
+        self.results = {}
+        self.register(self)
+
+    def register(self, thread, name: str = None):
+        '''name defaults to thread.name'''
+        with self.lock:
+            self.threads[name or thread.name] = thread
+
+    def sample(self):
+        now = time.monotonic()
+        with self.lock:
+            threads = list(self.threads.items())
+        results = {}
+        for name, thread in threads:
+            if not thread.is_alive():
+                results[name] = {'alive': False}
+                continue
+            cpu = thread_cpu_time(thread)
+            wakeups = thread_wakeups(thread)
+            result = {
+                'alive': True,
+                'cpu_seconds': None if cpu is None else round(cpu, 2),
+                'cpu_pct': None,
+                'wakeups_per_s': None,
+            }
+            previous = self.last.get(name)
+            if previous is not None and now > previous[0]:
+                elapsed = now - previous[0]
+                if cpu is not None and previous[1] is not None:
+                    result['cpu_pct'] = round((cpu - previous[1]) / elapsed * 100, 1)
+                if wakeups is not None and previous[2] is not None:
+                    result['wakeups_per_s'] = round((wakeups - previous[2]) / elapsed, 1)
+            self.last[name] = (now, cpu, wakeups)
+            results[name] = result
+        self.results = results
+
+    def stats(self) -> dict:
+        return self.results
+
+    def run(self):
+        while True:
+            self.sample()
+            self.clock.wait(self.interval)
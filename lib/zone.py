@@ -1,21 +1,22 @@
 from enum import Enum
 
-from microcontroller import Pin
+from lib.hardware import Pin
 from lib.heater import Heater
-import threading
 import time
 from lib.zoneConfig import ZoneConfig
 from lib.tempSensor import TempSensor, TempSensorReal, TempSensorSimulated
+from lib.sensorScheduler import SensorScheduler
 from lib.enums import BoardModel
+from lib.clock import Clock
+from lib.zoneState import ZoneStateTable, ZoneSnapshot
 import random
 import logging
 
 log = logging.getLogger(__name__)
-event = threading.Event()
 
 
-class Zone(threading.Thread):
-    stats = []
+class Zone():
+    table = ZoneStateTable()
 
     def __init__(
             self,
@@ -26,17 +27,25 @@ class Zone(threading.Thread):
             temp_scale: str,
             gpio_active_high: bool = True,
             temperature_average_samples: int = 10,
-            power_adjust: float = 1.0
+            power_adjust: float = 1.0,
+            clock: Clock = None,
+            sensor_scheduler: SensorScheduler = None,
+            sample_filter: str = None,
+            watts: float = None
     ) -> None:
         self._tuning = False
-        threading.Thread.__init__(self)
-        self.daemon = True
+        self.clock = clock if clock is not None else Clock()
         self.zone_name = name
         self.power_adjust = power_adjust
+        self.watts = watts
         self.temp_sensor = TempSensorReal(
-            thermocouple, sensor_time_wait, temp_scale, temperature_average_samples
+            thermocouple, sensor_time_wait, temp_scale, temperature_average_samples,
+            scheduler=sensor_scheduler, sample_filter=sample_filter
         )
         self.heat = 0
+        # seconds the heater was on in the last period and in total
+        self.delivered = 0.0
+        self.on_time = 0.0
         if gpio_heat is not None:
             log.info("Heater output created on %s." % (gpio_heat,))
             self.output = Heater(gpio_heat, gpio_active_high)
@@ -46,65 +55,42 @@ class Zone(threading.Thread):
 
         self.time_step = sensor_time_wait
 
-        self.zone_index = len(Zone.stats)
-        Zone.stats.append(self.getStats())
+        self.zone_index = Zone.table.add(
+            name, self.output is not None, self.time_step)
+        self.publish()
 
     def __repr__(self) -> str:
         return "{Name}: {Temp}° ({Delta}) <{Heat_pct}%>".format(**self.getStats())
 
-    def run(self):
-        while True:
-            # update stats
-            Zone.stats[self.zone_index] = self.getStats()
-            if self.output is not None:
-                # heater attached, turn it on if needed
-                if self._tuning:
-                    self.output.on()
-                    event.wait(1)
-                    continue
-                if self.heat > 0:
-                    self.output.on()
-                event.wait(self.heat)
-                self.output.off()
-                event.wait(self.time_step - self.heat)
-            else:
-                # no heater attached, just sleep
-                event.wait(self.time_step)
+    def publish(self):
+        '''store the current reading in this zone's slot of Zone.table'''
+        # asked first, a sample landing meanwhile is published next time
+        sampled = self.temp_sensor.has_reading
+        Zone.table.update(self.zone_index, self.getTemperature(),
+                          self.heat, self.isFaulted(),
+                          self.temp_sensor.rejected, sampled)
 
     def getDelta(self) -> float:
-        if self.output is not None:
-            return self.getTemperature() - Zone.getAvgTemp()
-        return 0
+        return Zone.snapshot()[self.zone_index].delta
+
+    @staticmethod
+    def snapshot() -> ZoneSnapshot:
+        return Zone.table.snapshot()
 
     @staticmethod
     def getAvgTemp() -> float:
-        temps = Zone.getTemps()
-        avg = sum(temps)/len(temps)
-        return round(avg, 2)
+        return Zone.snapshot().avg
 
     @staticmethod
     def getTemps() -> list:
-        if len(Zone.stats):
-            return [d['Temp'] for d in Zone.stats if d['Heated']]
-        return [0]
+        return Zone.snapshot().temps
 
     @staticmethod
     def getTempRange() -> float:
-        temps = Zone.getTemps()
-        if len(temps):
-            return max(temps) - min(temps)
-        return 0.0
+        return Zone.snapshot().range
 
     def getStats(self) -> dict:
-        return {
-            'Name': self.zone_name,
-            'Heated': self.output is not None,
-            'Temp': round(self.getTemperature(), 1),
-            'Delta': round(self.getDelta(), 1),
-            'Heat': round(self.heat, 1),
-            'Heat_pct': round(self.heat / self.time_step * 100, 1),
-            'Faulted': self.isFaulted(),
-        }
+        return Zone.snapshot()[self.zone_index].as_dict()
 
     def isFaulted(self) -> bool:
         return self.temp_sensor.faulted
@@ -120,9 +106,11 @@ class Zone(threading.Thread):
         if self.output is None:
             return
         self.heat = heat_on
+        self.publish()
 
     def reset(self):
         self._tuning = False
+        self.on_time = 0.0
         if self.output is None:
             return
         self.heat = 0
@@ -145,15 +133,23 @@ class SimulatedZone(Zone):
         self,
         temp_sensor: TempSensor,
         sensor_time_wait: int,
+        clock: Clock = None,
     ) -> None:
-        threading.Thread.__init__(self)
+        self._tuning = False
+        self.clock = clock if clock is not None else Clock()
+        self.power_adjust = 1.0
+        self.watts = None
         self.heat = 0
+        self.delivered = 0.0
+        self.on_time = 0.0
         self.output = False
-        self.temp_sensor = temp_sensor,
+        self.temp_sensor = temp_sensor
         self.time_step = sensor_time_wait
-        self.zone_index = len(Zone.stats)
-        self.zone_name = "Zone%d" % (self.zone_index,)
-        Zone.stats.append(self.getStats())
+        self.zone_name = "Zone%d" % (len(Zone.table),)
+        self.zone_index = Zone.table.add(self.zone_name, True, self.time_step)
+        # per zone generator so a simulation can seed repeatable divergence
+        self.random = random.Random()
+        self.publish()
 
     def setSimulatedParams(self, config):
         self.t_env = config.sim_t_env
@@ -171,10 +167,18 @@ class SimulatedZone(Zone):
         # start with power at 0
         self.p_ho = 0
         self.p_env = 0
-        Zone.stats[self.zone_index] = self.getStats()
+        self.publish()
+
+    def reset(self):
+        self._tuning = False
+        self.heat = 0
+        self.on_time = 0.0
 
     def heat_for(self, heat_on):
         self.heat = heat_on
+        # the simulated element delivers exactly what it is asked for
+        self.delivered = heat_on
+        self.on_time += heat_on
         self.Q_h = self.p_heat * heat_on
         self.temp_changes()
 
@@ -194,9 +198,8 @@ class SimulatedZone(Zone):
         self.t -= self.p_env * self.time_step / self.c_oven
 
         # introduce zone divergence - assumes zone 0 is on top
-        random.seed()
-        self.t -= random.randint(0, 10)/10 * (self.zone_index)
+        self.t -= self.random.randint(0, 10)/10 * (self.zone_index)
 
         self.temperature = self.t
         self.temp_sensor.temperature = self.t
-        Zone.stats[self.zone_index] = self.getStats()
+        self.publish()
@@ -1,4 +1,4 @@
-from microcontroller import Pin
+from lib.hardware import Pin
 from lib.max31856 import MAX31856
 
 
@@ -11,9 +11,13 @@ class ZoneConfig:
         thermocouple: MAX31856,
         gpio_active_high: bool = True,
         power_adjust: float = 1.0,
+        sample_filter: str = None,
+        watts: float = None,
     ) -> None:
         self.name = name
         self.gpio_heat = gpio_heat
         self.gpio_active_high = gpio_active_high
         self.thermocouple = thermocouple
         self.power_adjust = power_adjust
+        self.sample_filter = sample_filter
+        self.watts = watts
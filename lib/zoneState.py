@@ -0,0 +1,173 @@
+import threading
+import time
+from array import array
+
+
+class ZoneRecord():
+    '''one zone as seen by a ZoneSnapshot'''
+    __slots__ = ('name', 'heated', 'temperature', 'temp', 'delta', 'heat',
+                 'heat_pct', 'faulted', 'rejected', 'sampled')
+
+    def __init__(self, name, heated, temperature, delta, heat, heat_pct, faulted,
+                 rejected, sampled):
+        self.name = name
+        self.heated = heated
+        self.temperature = temperature
+        self.temp = round(temperature, 1)
+        self.delta = delta
+        self.heat = heat
+        self.heat_pct = heat_pct
+        self.faulted = faulted
+        self.rejected = rejected
+        # False until the sensor had a reading, temperature is then 0.0
+        self.sampled = sampled
+
+    def as_dict(self) -> dict:
+        '''the zone entry of Oven.get_state()'''
+        return {
+            'Name': self.name,
+            'Heated': self.heated,
+            'Temp': self.temp,
+            'Delta': self.delta,
+            'Heat': round(self.heat, 1),
+            'Heat_pct': self.heat_pct,
+            'Faulted': self.faulted,
+            'Rejected': self.rejected,
+        }
+
+
+class ZoneSnapshot():
+    '''every zone at the same instant plus the aggregates over the heated
+       zones, computed once. avg, min, max and range use the temperatures
+       rounded to 0.1 like the ui shows them.'''
+    __slots__ = ('seq', 'zones', 'temps', 'avg', 'min', 'max', 'range')
+
+    def __init__(self, seq, names, heated, temperature, heat, time_step, faulted,
+                 rejected, sampled):
+        self.seq = seq
+        self.temps = [round(t, 1) for t, h in zip(temperature, heated) if h]
+        if self.temps:
+            self.avg = round(sum(self.temps) / len(self.temps), 2)
+            self.min = min(self.temps)
+            self.max = max(self.temps)
+        else:
+            self.avg = self.min = self.max = 0
+        self.range = self.max - self.min
+        self.zones = tuple(
+            ZoneRecord(
+                names[i],
+                heated[i],
+                temperature[i],
+                round(temperature[i] - self.avg, 1) if heated[i] else 0,
+                heat[i],
+                round(heat[i] / time_step[i] * 100, 1),
+                bool(faulted[i]),
+                rejected[i],
+                bool(sampled[i]))
+            for i in range(len(names)))
+
+    def __len__(self):
+        return len(self.zones)
+
+    def __getitem__(self, slot) -> ZoneRecord:
+        return self.zones[slot]
+
+    def as_dicts(self) -> list:
+        return [z.as_dict() for z in self.zones]
+
+
+class ZoneStateTable():
+    '''latest reading of every zone, one slot per zone.
+
+       values live in flat arrays. writers bump seq to an odd number,
+       store and bump it back to even, readers copy the arrays and retry
+       if seq moved meanwhile, so a snapshot never mixes two updates.
+       the snapshot is cached until the next write.'''
+
+    def __init__(self):
+        self.names = []
+        self.heated = []
+        self.temperature = array('d')
+        self.heat = array('d')
+        self.time_step = array('d')
+        self.faulted = array('b')
+        self.rejected = array('q')
+        self.sampled = array('b')
+        self.seq = 0
+        self.write_lock = threading.Lock()
+        self._snapshot = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, heated, time_step) -> int:
+        '''reserve a slot for a zone, returns its index'''
+        with self.write_lock:
+            self.seq += 1
+            try:
+                self.names.append(name)
+                self.heated.append(heated)
+                self.temperature.append(0.0)
+                self.heat.append(0.0)
+                self.time_step.append(time_step)
+                self.faulted.append(0)
+                self.rejected.append(0)
+                self.sampled.append(0)
+            finally:
+                # even a failed write must leave seq even, or readers spin
+                self.seq += 1
+            return len(self.names) - 1
+
+    def update(self, slot, temperature, heat, faulted, rejected=0, sampled=True):
+        with self.write_lock:
+            self.seq += 1
+            try:
+                self.temperature[slot] = temperature
+                self.heat[slot] = heat
+                # faulted is the raw fault register, any bit counts
+                self.faulted[slot] = bool(faulted)
+                self.rejected[slot] = rejected
+                self.sampled[slot] = bool(sampled)
+            finally:
+                self.seq += 1
+
+    def snapshot(self) -> ZoneSnapshot:
+        while True:
+            seq = self.seq
+            cached = self._snapshot
+            if cached is not None and cached.seq == seq:
+                return cached
+            if seq & 1:
+                # a writer is half way through, let it finish
+                time.sleep(0)
+                continue
+            names = list(self.names)
+            heated = list(self.heated)
+            temperature = self.temperature[:]
+            heat = self.heat[:]
+            time_step = self.time_step[:]
+            faulted = self.faulted[:]
+            rejected = self.rejected[:]
+            sampled = self.sampled[:]
+            if self.seq == seq:
+                break
+        snapshot = ZoneSnapshot(
+            seq, names, heated, temperature, heat, time_step, faulted, rejected,
+            sampled)
+        self._snapshot = snapshot
+        return snapshot
+
+    def clear(self):
+        with self.write_lock:
+            self.seq += 1
+            try:
+                self.names = []
+                self.heated = []
+                self.temperature = array('d')
+                self.heat = array('d')
+                self.time_step = array('d')
+                self.faulted = array('b')
+                self.rejected = array('q')
+                self.sampled = array('b')
+            finally:
+                self.seq += 1
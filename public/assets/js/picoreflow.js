@@ -33,6 +33,10 @@ var host = "" + protocol + "//" + window.location.hostname + ":" + window.locati
 
 // wait for config before opening other sockets
 var ws_config, ws_status, ws_control, ws_storage;
+// status protocol 2: keyframes plus deltas, backlog deflated when supported
+var status_deflate = ('DecompressionStream' in window);
+var status_state = null;
+var status_queue = Promise.resolve();
 
 graphs.profile =
 {
@@ -520,7 +524,9 @@ $(document).ready(function () {
             openSockets();
         }
         function openSockets() {
-            ws_status = new WebSocket(host + "/status");
+            ws_status = new WebSocket(host + "/status?v=2" + (status_deflate ? "&deflate=1" : ""));
+            ws_status.binaryType = "arraybuffer";
+            status_state = null;
             ws_control = new WebSocket(host + "/control");
             ws_storage = new WebSocket(host + "/storage");
 
@@ -561,11 +567,50 @@ $(document).ready(function () {
             };
 
             ws_status.onmessage = function (e) {
+                // keep messages in order while a backlog is being inflated
+                status_queue = status_queue.then(function () {
+                    return decodeStatus(e.data);
+                }).then(function (x) {
+                    if (x) {
+                        handleStatus(x);
+                    }
+                }).catch(function (err) {
+                    console.log(err);
+                });
+            };
+
+            function decodeStatus(data) {
+                if (data instanceof ArrayBuffer) {
+                    var stream = new Blob([data]).stream().pipeThrough(new DecompressionStream("deflate"));
+                    return new Response(stream).text().then(JSON.parse);
+                }
                 if (debug_console) {
                     console.log("received status data")
-                    console.log(e.data);
+                    console.log(data);
                 }
-                x = JSON.parse(e.data);
+                var msg = JSON.parse(data);
+                if (msg.type == "key") {
+                    status_state = msg.state;
+                    return status_state;
+                }
+                if (msg.type == "delta") {
+                    if (status_state === null) {
+                        return null;
+                    }
+                    $.each(msg.set, function (path, value) {
+                        var keys = path.split(".");
+                        var target = status_state;
+                        for (var i = 0; i < keys.length - 1; i++) {
+                            target = target[keys[i]];
+                        }
+                        target[keys[keys.length - 1]] = value;
+                    });
+                    return status_state;
+                }
+                return msg;
+            }
+
+            function handleStatus(x) {
                 if (x.type == "backlog") {
                     if (x.profile) {
                         selected_profile_name = x.profile.name;
@@ -641,6 +686,10 @@ $(document).ready(function () {
                     }
 
                     $('#act_temp').html(parseInt(x.temperature));
+                    if (x.heat_rate !== undefined) {
+                        // estimated heating rate, degrees per second
+                        $('#act_rate').html(' ' + formatDPS(x.heat_rate) + '/' + time_scale_slope);
+                    }
                     if (x.zones) {
                         x.zones.forEach(zone => {
                             $(`#${zone.Name}_temp`).html(parseInt(zone.Temp));
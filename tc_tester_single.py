@@ -49,10 +49,12 @@ current_temp_thresholds = (0, 0)
 while True:
     current_temp_thresholds = sensor.temperature_thresholds
     current_cj_thresholds = sensor.reference_temperature_thresholds
-    current_faults = sensor.fault
+    # one conversion for both temperatures and the faults
+    temperature, reference_temperature, faults = sensor.read_all()
+    current_faults = sensor.decode_faults(faults)
     print(
         "Temps:    %.2f :: cj: %.2f"
-        % (sensor.temperature, sensor.reference_temperature)
+        % (temperature, reference_temperature)
     )
     print("Thresholds:")
     print("Temp low: %.2f high: %.2f" % current_temp_thresholds)
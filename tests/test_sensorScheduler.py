@@ -0,0 +1,46 @@
+import time
+
+from lib import hardware
+from lib.clock import Clock, VirtualClock
+from lib.max31856 import MAX31856, SampleType
+from lib.sensorScheduler import SensorScheduler
+
+
+def fake_chips(count, clock, continuous, temperature=500.0, noise=0.05):
+    '''count MAX31856 drivers on fake chips, on the fake board'''
+    if hardware.backend.name != 'fake':
+        hardware.use('fake')
+    board = hardware.board
+    board.reset()
+    board.clock = clock
+    chips = []
+    for i in range(count):
+        cs = hardware.digitalio.DigitalInOut(getattr(board, "D%d" % (i,)))
+        cs.switch_to_output(value=True)
+        board.thermocouple(cs.pin, temperature=temperature, noise=noise)
+        chips.append(MAX31856(board.SPI(), cs, continuous=continuous,
+                              samples=SampleType.AVG_SEL_4SAMP))
+    return chips
+
+
+def test_one_shot_frames_do_not_overrun():
+    scheduler = SensorScheduler(fake_chips(4, Clock(), False), 0.1)
+    scheduler.start()
+    time.sleep(2)
+    stats = scheduler.stats()
+    assert stats['frames'] >= 5
+    assert stats['overruns'] == 0
+
+
+def test_stable_temperature_is_not_a_duplicate():
+    clock = VirtualClock()
+    scheduler = SensorScheduler(
+        fake_chips(2, clock, True, noise=0), 0.5, clock=clock)
+    for i in range(10):
+        clock.wait(scheduler.period)
+        frame = scheduler.read_frame()
+        assert frame.fresh == [True, True]
+        assert frame.readings[0][0] == 500.0
+    # read again before a new conversion
+    assert scheduler.read_frame().fresh == [False, False]
+    assert scheduler.stats()['duplicates'] == [1, 1]